@@ -10,6 +10,7 @@ This script provides a simple command-line interface for approvers to:
 
 Usage:
     python approver_interface.py
+    python approver_interface.py < commands.txt   (batch mode)
 
 Commands:
     list        - List pending approvals
@@ -23,74 +24,186 @@ Commands:
     exit        - Exit the program
 """
 
+import io
 import os
 import sys
-import argparse
+import cmd
+import atexit
+import logging
+import functools
+from operator import itemgetter
+from types import MappingProxyType
 from datetime import datetime, timedelta
-from database_manager import DatabaseManager
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from dotenv import load_dotenv
+from database_manager import DatabaseManager, SMTPSession
 
-# Load environment variables from credentials.env file
-env_path = os.path.join('venv', 'credentials.env')
-if os.path.exists(env_path):
-    load_dotenv(env_path)
-    print(f"Loaded environment variables from {env_path}")
-else:
-    print(f"Warning: {env_path} not found. Email functionality may not work properly.")
+@functools.cache
+def _load_env():
+    """Load environment variables from the credentials.env file (once)"""
+    from dotenv import load_dotenv
+    
+    env_path = os.path.join('venv', 'credentials.env')
+    if os.path.exists(env_path):
+        load_dotenv(env_path)
+        print(f"Loaded environment variables from {env_path}")
+    else:
+        print(f"Warning: {env_path} not found. Email functionality may not work properly.")
+
+# Compact dtypes for the summary report DataFrame; the low-cardinality text
+# columns become categoricals. Amounts stay float64 so currency values keep
+# their precision in exported CSVs.
+_REPORT_DTYPES = {'status': 'category', 'vendor_name': 'category'}
+
+# Statuses broken out in the report statistics, in display order
+_REPORT_STATUSES = (
+    ('Validated', 'validated'),
+    ('Approved', 'approved'),
+    ('Rejected', 'rejected'),
+    ('Pending', 'pending'),
+)
+
+# Row layout for the pending approvals table
+_PENDING_FIELDS = itemgetter('report_id', 'invoice_number', 'po_number', 'vendor_name', 'total_amount')
+_PENDING_ROW = "{:<5} {:<15} {:<15} {:<20} ${:<10}"
+
+# Command usage and descriptions, shared by every interface instance. cmd.Cmd
+# dispatches each name to the matching ApproverInterface.do_<name> method.
+_COMMANDS = MappingProxyType({
+    'list': ('list', 'List pending approvals'),
+    'view': ('view <id>', 'View details of a specific invoice'),
+    'approve': ('approve <id> [comments]', 'Approve an invoice with optional comments'),
+    'reject': ('reject <id> [comments]', 'Reject an invoice with optional comments'),
+    'report': ('report [days]', 'Generate and view a summary report (default: last 30 days)'),
+    'export': ('export [path]', 'Export the summary report to CSV'),
+    'send': ('send', 'Send the summary report to stakeholders'),
+    'help': ('help', 'Show this help message'),
+    'exit': ('exit', 'Exit the program')
+})
+
+def _parse_report_id(report_id):
+    """
+    Parse a report ID argument.
+    
+    Args:
+        report_id (str): The raw command argument
+    
+    Returns:
+        int: The report ID, or None (after printing why) if it is missing or invalid
+    """
+    if not report_id:
+        print("Please provide a report ID")
+        return None
+    # Plain digit strings, the usual input, skip the exception-based parse.
+    # isdecimal() rather than isdigit(): int() rejects digits like '²'
+    if report_id.isdecimal():
+        report_id = int(report_id)
+    else:
+        try:
+            report_id = int(report_id)
+        except ValueError:
+            print("Report ID must be a number")
+            return None
+    if report_id <= 0:
+        print("Report ID must be positive")
+        return None
+    return report_id
+
+class ApproverInterface(cmd.Cmd):
+    intro = "=== Invoice Approver Interface ===\nType 'help' for a list of commands"
+    prompt = "\nEnter command: "
+
+    HELP = "\n".join(["\nAvailable commands:"] + [f"  {usage:<23} - {description}" for usage, description in _COMMANDS.values()])
+
+    # Pending approvals table header
+    _HEADER = f"{'ID':<5} {'Invoice':<15} {'PO Number':<15} {'Vendor':<20} {'Amount':<10}"
+    _DIVIDER = "-" * 70
 
-class ApproverInterface:
     def __init__(self):
         """Initialize the approver interface"""
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
         self.db_manager = DatabaseManager()
-        self.commands = {
-            'list': self.list_pending_approvals,
-            'view': self.view_invoice_details,
-            'approve': self.approve_invoice,
-            'reject': self.reject_invoice,
-            'report': self.generate_report,
-            'export': self.export_report,
-            'send': self.send_report,
-            'help': self.show_help,
-            'exit': self.exit_program
-        }
         
-        # Store the last generated report
+        # Email configuration is read once; it does not change at runtime.
+        # Values already in the environment take precedence over the file.
+        _load_env()
+        self._smtp = (os.getenv("SMTP_SERVER", "smtp.gmail.com"), int(os.getenv("SMTP_PORT", 587)))
+        self._sender = os.getenv("EMAIL_ADDRESS")
+        self._password = os.getenv("EMAIL_PASSWORD")
+        self.approver_email = os.getenv("APPROVER_EMAIL")
+        self.debug = os.getenv("APPROVER_DEBUG", "false").lower() == "true"
+        
+        # SMTP session kept open across 'send' commands
+        self._smtp_session = SMTPSession(*self._smtp, self._sender, self._password)
+        atexit.register(self._smtp_session.close)
+        
+        # Store the last generated report and its status counts
         self.last_report = None
+        self.report_stats = None
         self.report_start_date = None
         self.report_end_date = None
     
     def run(self):
         """Run the approver interface"""
-        print("=== Invoice Approver Interface ===")
+        try:
+            self.cmdloop()
+        except KeyboardInterrupt:
+            print("\nExiting...")
+    
+    def precmd(self, line):
+        """Match command names case-insensitively"""
+        if line == 'EOF':
+            return line
+        command, _, args = line.strip().partition(' ')
+        return f"{command.lower()} {args}" if args else command.lower()
+    
+    def onecmd(self, line):
+        """Dispatch a command, reporting errors without leaving the loop"""
+        try:
+            return super().onecmd(line)
+        except Exception as e:
+            print(f"Error: {e}")
+    
+    def emptyline(self):
+        """Ignore empty input instead of repeating the last command"""
+    
+    def default(self, line):
+        """Report an unknown command"""
+        print(f"Unknown command: {line.split()[0]}")
         print("Type 'help' for a list of commands")
-        
-        while True:
-            try:
-                command = input("\nEnter command: ").strip()
-                
-                if not command:
-                    continue
-                
-                parts = command.split()
-                cmd = parts[0].lower()
-                args = parts[1:] if len(parts) > 1 else []
-                
-                if cmd in self.commands:
-                    self.commands[cmd](*args)
-                else:
-                    print(f"Unknown command: {cmd}")
-                    print("Type 'help' for a list of commands")
-            
-            except KeyboardInterrupt:
-                print("\nExiting...")
-                break
-            except Exception as e:
-                print(f"Error: {e}")
+    
+    def completenames(self, text, *ignored):
+        """Complete command names from the command table"""
+        return [name for name in _COMMANDS if name.startswith(text)]
+    
+    def do_list(self, arg):
+        self.list_pending_approvals(*arg.split())
+    
+    def do_view(self, arg):
+        self.view_invoice_details(*arg.split())
+    
+    def do_approve(self, arg):
+        self.approve_invoice(*arg.split())
+    
+    def do_reject(self, arg):
+        self.reject_invoice(*arg.split())
+    
+    def do_report(self, arg):
+        self.generate_report(*arg.split())
+    
+    def do_export(self, arg):
+        self.export_report(*arg.split())
+    
+    def do_send(self, arg):
+        self.send_report(*arg.split())
+    
+    def do_help(self, arg):
+        self.show_help()
+    
+    def do_exit(self, arg):
+        return self.exit_program()
+    
+    def do_EOF(self, arg):
+        return self.exit_program()
     
     def list_pending_approvals(self):
         """List all pending approvals"""
@@ -101,101 +214,58 @@ class ApproverInterface:
             return
         
         print("\nPending Approvals:")
-        print(f"{'ID':<5} {'Invoice':<15} {'PO Number':<15} {'Vendor':<20} {'Amount':<10}")
-        print("-" * 70)
+        print(self._HEADER)
+        print(self._DIVIDER)
         
-        for approval in pending_approvals:
-            print(f"{approval['report_id']:<5} {approval['invoice_number']:<15} {approval['po_number']:<15} {approval['vendor_name']:<20} ${approval['total_amount']:<10}")
+        rows = [_PENDING_ROW.format(*_PENDING_FIELDS(approval)) for approval in pending_approvals]
+        sys.stdout.write("\n".join(rows) + "\n")
     
     def view_invoice_details(self, report_id=None):
         """View details of a specific invoice"""
-        if not report_id:
-            print("Please provide a report ID")
-            return
-        
-        try:
-            report_id = int(report_id)
-        except ValueError:
-            print("Report ID must be a number")
+        report_id = _parse_report_id(report_id)
+        if report_id is None:
             return
         
         # Get the validation report
-        conn = self.db_manager._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT 
-            vr.id, vr.report_content, vr.approval_status,
-            i.invoice_number, i.po_number, i.vendor_name, i.total_amount, i.file_path
-        FROM 
-            validation_reports vr
-        JOIN 
-            invoices i ON vr.invoice_id = i.id
-        WHERE 
-            vr.id = ?
-        ''', (report_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        report = self.db_manager.get_validation_report(report_id)
         
-        if not row:
+        if not report:
             print(f"Report with ID {report_id} not found")
             return
         
-        report_id, report_content, approval_status, invoice_number, po_number, vendor_name, total_amount, file_path = row
-        
         print("\nInvoice Details:")
-        print(f"Report ID: {report_id}")
-        print(f"Invoice Number: {invoice_number}")
-        print(f"PO Number: {po_number}")
-        print(f"Vendor: {vendor_name}")
-        print(f"Amount: ${total_amount}")
-        print(f"Status: {approval_status}")
-        print(f"File: {file_path}")
+        print(f"Report ID: {report['id']}")
+        print(f"Invoice Number: {report['invoice_number']}")
+        print(f"PO Number: {report['po_number']}")
+        print(f"Vendor: {report['vendor_name']}")
+        print(f"Amount: ${report['total_amount']}")
+        print(f"Status: {report['approval_status']}")
+        print(f"File: {report['file_path']}")
         print("\nValidation Report:")
-        print(report_content)
+        print(report['report_content'])
     
     def approve_invoice(self, report_id=None, *comments):
         """Approve an invoice"""
-        if not report_id:
-            print("Please provide a report ID")
-            return
-        
-        try:
-            report_id = int(report_id)
-        except ValueError:
-            print("Report ID must be a number")
-            return
-        
-        comments_text = " ".join(comments) if comments else "Approved without comments"
-        
-        success = self.db_manager.update_approval_status(report_id, 'approved', comments_text)
-        
-        if success:
-            print(f"Invoice with report ID {report_id} has been approved")
-        else:
-            print(f"Failed to approve invoice with report ID {report_id}")
+        self._record_decision(report_id, comments, 'approve', 'approved')
     
     def reject_invoice(self, report_id=None, *comments):
         """Reject an invoice"""
-        if not report_id:
-            print("Please provide a report ID")
-            return
-        
-        try:
-            report_id = int(report_id)
-        except ValueError:
-            print("Report ID must be a number")
+        self._record_decision(report_id, comments, 'reject', 'rejected')
+    
+    def _record_decision(self, report_id, comments, action, approval_status):
+        """Store an approve/reject decision with the approver's comments"""
+        report_id = _parse_report_id(report_id)
+        if report_id is None:
             return
         
-        comments_text = " ".join(comments) if comments else "Rejected without comments"
+        comments_text = " ".join(comments) if comments else f"{approval_status.capitalize()} without comments"
         
-        success = self.db_manager.update_approval_status(report_id, 'rejected', comments_text)
+        success = self.db_manager.update_approval_status(report_id, approval_status, comments_text)
         
         if success:
-            print(f"Invoice with report ID {report_id} has been rejected")
+            print(f"Invoice with report ID {report_id} has been {approval_status}")
         else:
-            print(f"Failed to reject invoice with report ID {report_id}")
+            print(f"Failed to {action} invoice with report ID {report_id}")
     
     def generate_report(self, days=30):
         """Generate a summary report"""
@@ -213,35 +283,41 @@ class ApproverInterface:
         
         print(f"\nGenerating summary report for {self.report_start_date} to {self.report_end_date}...")
         
-        self.last_report = self.db_manager.generate_summary_report(
-            start_date=self.report_start_date,
-            end_date=self.report_end_date
-        )
-        
-        if self.last_report.empty:
+        self.last_report = None
+        report = self._get_last_report()
+        if report.empty:
+            self.report_stats = {}
             print("No data available for the specified date range")
             return
         
         print("\nSummary Report:")
-        print(self.last_report)
+        print(report)
         
-        # Print statistics
-        total_invoices = len(self.last_report)
-        validated = len(self.last_report[self.last_report['status'] == 'validated'])
-        approved = len(self.last_report[self.last_report['status'] == 'approved'])
-        rejected = len(self.last_report[self.last_report['status'] == 'rejected'])
-        pending = len(self.last_report[self.last_report['status'] == 'pending'])
+        # Counted from the loaded report in one pass over the categorical status
+        self.report_stats = report['status'].value_counts().to_dict()
+        total_invoices = len(report)
         
         print("\nStatistics:")
         print(f"Total Invoices: {total_invoices}")
-        print(f"Validated: {validated} ({validated/total_invoices*100:.1f}%)")
-        print(f"Approved: {approved} ({approved/total_invoices*100:.1f}%)")
-        print(f"Rejected: {rejected} ({rejected/total_invoices*100:.1f}%)")
-        print(f"Pending: {pending} ({pending/total_invoices*100:.1f}%)")
+        for label, status in _REPORT_STATUSES:
+            count = self.report_stats.get(status, 0)
+            print(f"{label}: {count} ({count/total_invoices*100:.1f}%)")
+    
+    def _get_last_report(self):
+        """Load the summary report DataFrame for the current date range on first use"""
+        if self.last_report is None:
+            self.last_report = self.db_manager.generate_summary_report(
+                start_date=self.report_start_date,
+                end_date=self.report_end_date,
+                dtype=_REPORT_DTYPES
+            )
+            if self.debug:
+                print(f"Summary report memory: {self.last_report.memory_usage(deep=True).sum() / 1e6:.3f} MB")
+        return self.last_report
     
     def export_report(self, output_path=None):
         """Export the summary report to CSV"""
-        if self.last_report is None:
+        if self.report_stats is None:
             print("No report generated yet. Use 'report' command first.")
             return
         
@@ -261,37 +337,37 @@ class ApproverInterface:
     
     def send_report(self):
         """Send the summary report to stakeholders"""
-        if self.last_report is None:
+        from email.message import EmailMessage
+        
+        if self.report_stats is None:
             print("No report generated yet. Use 'report' command first.")
             return
 
-        # Get approver email from environment variables directly
-        approver_email = os.getenv("APPROVER_EMAIL")
-        if not approver_email:
+        # APPROVER_EMAIL may hold a comma-separated list of stakeholders
+        recipients = [addr.strip() for addr in (self.approver_email or "").split(",") if addr.strip()]
+        if not recipients:
             print("No approver email configured in environment variables.")
             print("Please check your credentials.env file and ensure APPROVER_EMAIL is set.")
             return
 
-        # Generate a temporary CSV file for the report
+        # Serialize the report in memory; the filename is only used for the attachment
         report_file = f"invoice_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        self.last_report.to_csv(report_file, index=False)
+        report_csv = io.BytesIO()
+        self._get_last_report().to_csv(report_csv, index=False)
 
-        # Email configuration - get directly from environment variables
-        sender_email = os.getenv("EMAIL_ADDRESS")
-        sender_password = os.getenv("EMAIL_PASSWORD")
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", 587))
+        sender_email = self._sender
+        smtp_server, smtp_port = self._smtp
         
         # Print configuration for debugging (without password)
         print(f"Using email configuration:")
         print(f"  From: {sender_email}")
-        print(f"  To: {approver_email}")
+        print(f"  To: {', '.join(recipients)}")
         print(f"  SMTP Server: {smtp_server}:{smtp_port}")
 
         # Create the email
-        msg = MIMEMultipart()
+        msg = EmailMessage()
         msg["From"] = sender_email
-        msg["To"] = approver_email
+        msg["To"] = ", ".join(recipients)
         msg["Subject"] = "Invoice Summary Report"
 
         # Email body
@@ -303,32 +379,19 @@ class ApproverInterface:
         Best regards,
         Invoice Processing System
         """
-        msg.attach(MIMEText(body, "plain"))
+        msg.set_content(body)
 
-        # Attach the CSV file
-        with open(report_file, "rb") as attachment:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header(
-                "Content-Disposition",
-                f"attachment; filename={report_file}",
-            )
-            msg.attach(part)
+        # Attach the CSV report
+        msg.add_attachment(report_csv.getvalue(), maintype="text", subtype="csv", filename=report_file)
 
-        # Send the email
+        # Send the email to all recipients in one transaction, reconnecting
+        # once if the server dropped the idle session
         try:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(sender_email, sender_password)
-                server.send_message(msg)
-            print(f"Summary report sent to {approver_email}")
+            self._smtp_session.send_message(msg, sender_email, recipients)
+            print(f"Summary report sent to {', '.join(recipients)}")
         except Exception as e:
+            self._smtp_session.close()
             print(f"Failed to send summary report: {e}")
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(report_file):
-                os.remove(report_file)
     
     def set_approver_email(self, email):
         """
@@ -352,32 +415,14 @@ class ApproverInterface:
             self.logger.error(f"Error setting approver email: {e}")
             return False
     
-    def update_approver_email(self):
-        """Update the approver's email address"""
-        db_manager = DatabaseManager()
-        success = db_manager.set_approver_email("new_approver_email@example.com")
-        if success:
-            print("Approver email updated successfully.")
-        else:
-            print("Failed to update approver email.")
-    
     def show_help(self):
         """Show help message"""
-        print("\nAvailable commands:")
-        print("  list                    - List pending approvals")
-        print("  view <id>               - View details of a specific invoice")
-        print("  approve <id> [comments] - Approve an invoice with optional comments")
-        print("  reject <id> [comments]  - Reject an invoice with optional comments")
-        print("  report [days]           - Generate and view a summary report (default: last 30 days)")
-        print("  export [path]           - Export the summary report to CSV")
-        print("  send                    - Send the summary report to stakeholders")
-        print("  help                    - Show this help message")
-        print("  exit                    - Exit the program")
+        sys.stdout.write(self.HELP + "\n")
     
     def exit_program(self):
         """Exit the program"""
         print("Exiting...")
-        sys.exit(0)
+        return True
 
 def main():
     """Main function"""
@@ -1,12 +1,16 @@
 import sqlite3
 import os
+import csv
+import gzip
+import json
+import queue
 import logging
+import threading
+import weakref
 import pandas as pd
 from datetime import datetime
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
+from email.message import EmailMessage
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,11 +19,306 @@ load_dotenv()
 # Debug print statement commented out
 # print(os.path.exists('invoices.db'))  # Should return True if the file exists
 
+# Statements run on the shared connection are kept as module constants so
+# sqlite3's per-connection statement cache reuses the compiled statements.
+_SQL_INSERT_PURCHASE_ORDER = '''
+INSERT OR IGNORE INTO purchase_orders (po_number, vendor_name, issue_date, total_amount, status)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+_SQL_INSERT_INVOICE = '''
+INSERT OR IGNORE INTO invoices (invoice_number, po_number, vendor_name, invoice_date, total_amount, file_path, status)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+_SQL_INSERT_PROCESSED_EMAIL = 'INSERT OR IGNORE INTO processed_emails (message_id) VALUES (?)'
+
+_SQL_SELECT_PROCESSED_EMAIL = 'SELECT 1 FROM processed_emails WHERE message_id = ?'
+
+_SQL_INSERT_PROCESSED_ATTACHMENT = 'INSERT OR IGNORE INTO processed_attachments (content_hash) VALUES (?)'
+
+_SQL_SELECT_PROCESSED_ATTACHMENT = 'SELECT 1 FROM processed_attachments WHERE content_hash = ?'
+
+# Duplicates come back as no row instead of raising IntegrityError
+_SQL_INSERT_INVOICE_RETURNING = _SQL_INSERT_INVOICE.rstrip() + ' RETURNING id'
+
+_SQL_UPDATE_REPORT_STATUS = '''
+UPDATE validation_reports
+SET approval_status = ?,
+    report_content = report_content || ?
+WHERE id = ?
+'''
+
+_SQL_UPDATE_REPORT_INVOICE_STATUS = '''
+UPDATE invoices SET status = ?
+WHERE id = (SELECT invoice_id FROM validation_reports WHERE id = ?)
+'''
+
+_SQL_PENDING_APPROVALS = '''
+SELECT
+    vr.id as report_id,
+    i.invoice_number,
+    i.po_number,
+    i.vendor_name,
+    i.total_amount,
+    i.file_path,
+    vr.created_at
+FROM
+    validation_reports vr
+JOIN
+    invoices i ON vr.invoice_id = i.id
+WHERE
+    vr.approval_status = 'requires_approval'
+ORDER BY
+    vr.created_at DESC, vr.id DESC
+'''
+
+_SQL_VALIDATE_PO = "SELECT id FROM purchase_orders WHERE po_number = ? AND status = 'active'"
+
+_SQL_GET_INVOICE_ID = 'SELECT id FROM invoices WHERE invoice_number = ?'
+
+_SQL_INVOICE_DETAILS = '''
+SELECT
+    i.id, i.invoice_number, i.po_number, i.vendor_name,
+    i.invoice_date, i.total_amount, i.file_path, i.status,
+    i.validation_result, i.created_at,
+    vr.id as report_id, vr.report_content, vr.approval_status
+FROM
+    invoices i
+LEFT JOIN
+    validation_reports vr ON i.id = vr.invoice_id
+WHERE
+    i.id = ?
+'''
+
+_SQL_VALIDATION_REPORT = '''
+SELECT
+    vr.id, vr.report_content, vr.approval_status,
+    i.invoice_number, i.po_number, i.vendor_name, i.total_amount, i.file_path
+FROM
+    validation_reports vr
+JOIN
+    invoices i ON vr.invoice_id = i.id
+WHERE
+    vr.id = ?
+'''
+
+_SQL_VALIDATE_INVOICES = '''
+SELECT
+    i.id, i.invoice_number, i.po_number, i.vendor_name, i.total_amount, i.file_path,
+    p.id, p.vendor_name, p.total_amount,
+    p.vendor_name <> i.vendor_name COLLATE NOCASE AS vendor_differs
+FROM invoices i
+LEFT JOIN purchase_orders p ON p.po_number = i.po_number
+'''
+
+_SQL_VALIDATE_INVOICE = _SQL_VALIDATE_INVOICES + 'WHERE i.id = ?'
+
+_SQL_MARK_PO_NOT_FOUND = '''
+UPDATE invoices SET status = 'error', validation_result = 'Purchase order not found'
+WHERE id = ?
+'''
+
+_SQL_UPDATE_VALIDATION = '''
+UPDATE invoices SET status = ?, validation_result = ?
+WHERE id = ?
+'''
+
+_SQL_INSERT_REPORT = '''
+INSERT INTO validation_reports (invoice_id, report_content, discrepancies, approval_status)
+VALUES (?, ?, ?, ?)
+RETURNING id, created_at
+'''
+
+_SQL_DATA_VERSION = 'PRAGMA data_version'
+
+_SQL_SUMMARY_REPORT = '''
+SELECT
+    i.invoice_number,
+    i.po_number,
+    i.vendor_name,
+    i.invoice_date,
+    i.total_amount,
+    i.status,
+    i.validation_result,
+    vr.approval_status
+FROM
+    invoices i
+LEFT JOIN
+    validation_reports vr ON i.id = vr.invoice_id
+'''
+
+# Returned (as a copy) when the summary query matches nothing, which skips
+# building a frame from an empty record list
+_EMPTY_SUMMARY_REPORT = pd.DataFrame(columns=[
+    'invoice_number', 'po_number', 'vendor_name', 'invoice_date',
+    'total_amount', 'status', 'validation_result', 'approval_status'
+])
+
+def _configure_conn(conn):
+    """
+    Apply the per-connection PRAGMAs used by every database connection.
+    
+    Args:
+        conn (sqlite3.Connection): Freshly opened connection
+    
+    Returns:
+        sqlite3.Connection: The same connection, for chaining
+    """
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.row_factory = sqlite3.Row  # This enables column access by name
+    return conn
+
+# Discrepancy line templates keyed on field; other fields use the default
+_DISCREPANCY_TEMPLATES = {
+    "total_amount": "- {label}: PO: ${po_value} vs Invoice: ${invoice_value} (Difference: ${difference})",
+}
+_DEFAULT_DISCREPANCY_TEMPLATE = "- {label}: PO: {po_value} vs Invoice: {invoice_value}"
+
+# Body of the validation report sent to approvers; the indentation is part of
+# the stored and emailed text
+_REPORT_TEMPLATE = """
+            Invoice Validation Report
+            -------------------------
+            Invoice Number: {invoice_number}
+            Purchase Order: {po_number}
+            Validation Status: {status}
+            
+            Details:
+            - Invoice Vendor: {invoice_vendor}
+            - PO Vendor: {po_vendor}
+            - Invoice Amount: ${invoice_amount}
+            - PO Amount: ${po_amount}
+            
+            Discrepancies:
+            {discrepancies}
+            """
+
+def _close_connection(conn, logger):
+    """
+    Optimize and close a database connection.
+    
+    Args:
+        conn (sqlite3.Connection): Connection to close
+        logger (logging.Logger): Logger for optimize failures
+    """
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error as e:
+        logger.warning(f"Error optimizing database: {e}")
+    conn.close()
+
+def _finalize_manager(manager_ref, conn, logger):
+    """
+    Finalizer for a DatabaseManager connection.
+    
+    At interpreter exit the manager is still alive, so it is closed normally,
+    which also sends any queued validation reports. Once the manager has been
+    collected only its connection is left to close.
+    
+    Args:
+        manager_ref (weakref.ref): Weak reference to the manager
+        conn (sqlite3.Connection): The manager's connection
+        logger (logging.Logger): Logger for optimize failures
+    """
+    manager = manager_ref()
+    if manager is not None:
+        manager.close()
+    else:
+        _close_connection(conn, logger)
+
+class SMTPSession:
+    """
+    SMTP session kept open between sends, shared by everything that sends email.
+    
+    The session is checked with NOOP before reuse and logged in again when it
+    has gone stale. It is not thread-safe; callers that send from several
+    threads serialize access themselves.
+    """
+
+    def __init__(self, server, port, username, password):
+        """
+        Args:
+            server (str): SMTP server host
+            port (int): SMTP server port
+            username (str): Login for the server
+            password (str): Password for the server
+        """
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self._conn = None
+
+    def connection(self):
+        """
+        Return the open SMTP session, logging in again if it is missing or stale.
+        
+        Returns:
+            smtplib.SMTP: An authenticated SMTP session
+        """
+        if self._conn is not None:
+            try:
+                if self._conn.noop()[0] == 250:
+                    return self._conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+        
+        server = smtplib.SMTP(self.server, self.port)
+        try:
+            server.starttls()
+            server.login(self.username, self.password)
+        except BaseException:
+            server.close()
+            raise
+        self._conn = server
+        return server
+
+    def send_message(self, msg, *args):
+        """
+        Send a message, reconnecting once if the server dropped the idle session.
+        
+        Args:
+            msg (email.message.Message): Message to send
+            *args: Optional from address and recipients, as for smtplib.SMTP.send_message
+        """
+        try:
+            self.connection().send_message(msg, *args)
+        except smtplib.SMTPServerDisconnected:
+            self._conn = None
+            self.connection().send_message(msg, *args)
+
+    def close(self):
+        """Close the SMTP session if one is open."""
+        if self._conn is None:
+            return
+        try:
+            self._conn.quit()
+        except (smtplib.SMTPException, OSError):
+            self._conn.close()
+        self._conn = None
+
 class DatabaseManager:
     def __init__(self, db_path='invoices.db'):
         self.db_path = db_path
         self.logger = logging.getLogger(__name__)
+        # One long-lived connection shared by every method; the re-entrant lock
+        # serializes access since callers may run on different threads
+        self._lock = threading.RLock()
+        self._conn = self._open_connection()
         self.setup_database()
+        
+        # Most recent summary report as (date range, stamp, DataFrame), kept
+        # until the database changes
+        self._summary_cache = None
+        
+        # Pending approvals with the data_version they were read at; reset
+        # when an approval status changes
+        self._pending_cache = None
 
         # Email configuration
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
@@ -28,83 +327,129 @@ class DatabaseManager:
         self.email_password = os.getenv('EMAIL_PASSWORD')
         self.approver_email = os.getenv('APPROVER_EMAIL')
 
+        # Validation reports are mailed by a background worker, started on
+        # first use, over one SMTP session kept open between sends
+        self._mail_queue = queue.Queue()
+        self._mail_thread = None
+        # Guards starting and stopping the worker; validations can queue
+        # reports from several threads at once
+        self._mail_thread_lock = threading.Lock()
+        self._smtp_lock = threading.Lock()
+        self._smtp = SMTPSession(self.smtp_server, self.smtp_port, self.email_address, self.email_password)
+
     def setup_database(self):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create purchase_orders table with UNIQUE constraint on po_number
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS purchase_orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                po_number TEXT UNIQUE,
-                vendor_name TEXT,
-                issue_date TEXT,
-                total_amount REAL,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-            
-            # Create invoices table with UNIQUE constraint
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS invoices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_number TEXT UNIQUE,
-                po_number TEXT,
-                vendor_name TEXT,
-                invoice_date TEXT,
-                total_amount REAL,
-                file_path TEXT,
-                status TEXT DEFAULT 'pending',
-                validation_result TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (po_number) REFERENCES purchase_orders (po_number)
-            )
-            ''')
-            
-            # Create validation_reports table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS validation_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_id INTEGER,
-                report_content TEXT,
-                discrepancies TEXT,
-                approval_status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (invoice_id) REFERENCES invoices (id)
-            )
-            ''')
-            
-            conn.commit()
-            self.logger.info("Database schema setup complete")
-            
-            # Remove duplicate invoices
-            cursor.execute('''
-            DELETE FROM invoices
-            WHERE id NOT IN (
-                SELECT MIN(id)
-                FROM invoices
-                GROUP BY invoice_number
-            );
-            ''')
-            
-            # Remove duplicate purchase orders
-            cursor.execute('''
-            DELETE FROM purchase_orders
-            WHERE id NOT IN (
-                SELECT MIN(id)
-                FROM purchase_orders
-                GROUP BY po_number
-            );
-            ''')
-            
-            conn.commit()
-        except Exception as e:
-            self.logger.error(f"Error setting up database: {e}")
-        finally:
-            if conn:
-                conn.close()
+        with self._lock:
+            try:
+                conn = self.conn
+                # WAL is persistent in the database file, so it only needs setting once
+                conn.execute("PRAGMA journal_mode=WAL")
+                cursor = conn.cursor()
+            
+                # Create purchase_orders table with UNIQUE constraint on po_number
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS purchase_orders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    po_number TEXT UNIQUE,
+                    vendor_name TEXT COLLATE NOCASE,
+                    issue_date TEXT,
+                    total_amount REAL,
+                    status TEXT DEFAULT 'active',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+            
+                # Create invoices table with UNIQUE constraint
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS invoices (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    invoice_number TEXT UNIQUE,
+                    po_number TEXT,
+                    vendor_name TEXT COLLATE NOCASE,
+                    invoice_date TEXT,
+                    total_amount REAL,
+                    file_path TEXT,
+                    status TEXT DEFAULT 'pending',
+                    validation_result TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (po_number) REFERENCES purchase_orders (po_number)
+                )
+                ''')
+            
+                # Create validation_reports table
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS validation_reports (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    invoice_id INTEGER,
+                    report_content TEXT,
+                    discrepancies TEXT,
+                    approval_status TEXT DEFAULT 'pending',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (invoice_id) REFERENCES invoices (id)
+                )
+                ''')
+            
+                # Create processed_emails table, keyed by Message-ID so the email
+                # monitor records each email with a single insert
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS processed_emails (
+                    message_id TEXT PRIMARY KEY,
+                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+            
+                # Create processed_attachments table, keyed by a hash of the file
+                # contents so resent attachments are recognised
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS processed_attachments (
+                    content_hash TEXT PRIMARY KEY,
+                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+            
+                # Indexes for the right-hand side of the report and approval JOINs
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_invoices_po ON invoices (po_number)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_invoice ON validation_reports (invoice_id)')
+            
+                conn.commit()
+                self.logger.info("Database schema setup complete")
+            
+                # The UNIQUE constraints keep the tables free of duplicates, so
+                # databases created before them only need cleaning up once
+                cursor.execute("PRAGMA user_version")
+                user_version = cursor.fetchone()[0]
+                if user_version < 1:
+                    # Remove duplicate invoices
+                    cursor.execute('''
+                    DELETE FROM invoices
+                    WHERE rowid NOT IN (
+                        SELECT MIN(rowid)
+                        FROM invoices
+                        GROUP BY invoice_number
+                    );
+                    ''')
+            
+                    # Remove duplicate purchase orders
+                    cursor.execute('''
+                    DELETE FROM purchase_orders
+                    WHERE rowid NOT IN (
+                        SELECT MIN(rowid)
+                        FROM purchase_orders
+                        GROUP BY po_number
+                    );
+                    ''')
+            
+                    cursor.execute("PRAGMA user_version = 1")
+                    conn.commit()
+            
+                # Gather planner statistics for the new indexes once; PRAGMA
+                # optimize on close keeps them current afterwards
+                if user_version < 2:
+                    cursor.execute("ANALYZE")
+                    cursor.execute("PRAGMA user_version = 2")
+                    conn.commit()
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error setting up database: {e}")
 
     def add_purchase_order(self, po_data):
         """
@@ -121,33 +466,45 @@ class DatabaseManager:
         Returns:
             bool: True if successful, False otherwise
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            INSERT INTO purchase_orders (po_number, vendor_name, issue_date, total_amount, status)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (
-                po_data.get('po_number'),
-                po_data.get('vendor_name'),
-                po_data.get('issue_date'),
-                po_data.get('total_amount'),
-                po_data.get('status', 'active')
-            ))
-            
-            conn.commit()
+        added = self.add_purchase_orders_bulk([po_data])
+        if added:
             self.logger.info(f"Added purchase order: {po_data.get('po_number')}")
-            return True
-        except sqlite3.IntegrityError:
+        elif added == 0:
             self.logger.warning(f"Purchase order {po_data.get('po_number')} already exists")
-            return False
-        except Exception as e:
-            self.logger.error(f"Error adding purchase order: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+        return bool(added)
+
+    def add_purchase_orders_bulk(self, po_list):
+        """
+        Add several purchase orders in a single transaction.
+        
+        Purchase orders whose po_number already exists are skipped.
+        
+        Args:
+            po_list (list): List of purchase order dictionaries, as accepted
+                by add_purchase_order
+        
+        Returns:
+            int: Number of purchase orders inserted, or None if failed
+        """
+        rows = [(
+            po_data.get('po_number'),
+            po_data.get('vendor_name'),
+            po_data.get('issue_date'),
+            po_data.get('total_amount'),
+            po_data.get('status', 'active')
+        ) for po_data in po_list]
+        
+        with self._lock:
+            conn = self.conn
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(_SQL_INSERT_PURCHASE_ORDER, rows)
+                conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error adding purchase orders: {e}")
+                return None
 
     def add_invoice(self, invoice_data):
         """
@@ -165,36 +522,163 @@ class DatabaseManager:
         Returns:
             int: ID of the added invoice, or None if failed
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            INSERT INTO invoices (invoice_number, po_number, vendor_name, invoice_date, total_amount, file_path, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                invoice_data.get('invoice_number'),
-                invoice_data.get('purchase_order'),
-                invoice_data.get('vendor_name'),
-                invoice_data.get('invoice_date'),
-                invoice_data.get('total_amount'),
-                invoice_data.get('file_path'),
-                'pending'
-            ))
-            
-            invoice_id = cursor.lastrowid
-            conn.commit()
-            self.logger.info(f"Added invoice: {invoice_data.get('invoice_number')}")
-            return invoice_id
-        except sqlite3.IntegrityError:
-            self.logger.warning(f"Duplicate invoice detected: {invoice_data.get('invoice_number')}")
-            return None
-        except Exception as e:
-            self.logger.error(f"Error adding invoice: {e}")
-            return None
-        finally:
-            if conn:
-                conn.close()
+        with self._lock:
+            try:
+                conn = self.conn
+                cursor = conn.cursor()
+            
+                cursor.execute(_SQL_INSERT_INVOICE_RETURNING, (
+                    invoice_data.get('invoice_number'),
+                    invoice_data.get('purchase_order'),
+                    invoice_data.get('vendor_name'),
+                    invoice_data.get('invoice_date'),
+                    invoice_data.get('total_amount'),
+                    invoice_data.get('file_path'),
+                    'pending'
+                ))
+            
+                row = cursor.fetchone()
+                conn.commit()
+                if row is None:
+                    self.logger.warning(f"Duplicate invoice detected: {invoice_data.get('invoice_number')}")
+                    return None
+                self.logger.info(f"Added invoice: {invoice_data.get('invoice_number')}")
+                return row[0]
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error adding invoice: {e}")
+                return None
+
+    def add_invoices_bulk(self, invoice_list):
+        """
+        Add several invoices in a single transaction.
+        
+        Invoices whose invoice_number already exists are skipped.
+        
+        Args:
+            invoice_list (list): List of invoice dictionaries, as accepted
+                by add_invoice
+        
+        Returns:
+            int: Number of invoices inserted, or None if failed
+        """
+        rows = [(
+            invoice_data.get('invoice_number'),
+            invoice_data.get('purchase_order'),
+            invoice_data.get('vendor_name'),
+            invoice_data.get('invoice_date'),
+            invoice_data.get('total_amount'),
+            invoice_data.get('file_path'),
+            'pending'
+        ) for invoice_data in invoice_list]
+        
+        with self._lock:
+            conn = self.conn
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(_SQL_INSERT_INVOICE, rows)
+                conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error adding invoices: {e}")
+                return None
+
+    def is_email_processed(self, message_id):
+        """
+        Check whether an email was already processed.
+        
+        Args:
+            message_id (str): Message-ID header of the email
+        
+        Returns:
+            bool: True if the email was already processed, False otherwise
+        """
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute(_SQL_SELECT_PROCESSED_EMAIL, (message_id,))
+                return cursor.fetchone() is not None
+            except Exception as e:
+                self.logger.error(f"Error checking processed email: {e}")
+                return False
+
+    def mark_email_processed(self, message_id):
+        """
+        Record an email as processed.
+        
+        Args:
+            message_id (str): Message-ID header of the email
+        
+        Returns:
+            int: 1 if the email was newly recorded, 0 if it had already been
+                processed, or None if failed
+        """
+        return self.add_processed_emails_bulk([message_id])
+
+    def add_processed_emails_bulk(self, message_ids):
+        """
+        Record several emails as processed in a single transaction.
+        
+        Args:
+            message_ids (list): Message-ID headers of the emails
+        
+        Returns:
+            int: Number of emails newly recorded, or None if failed
+        """
+        with self._lock:
+            conn = self.conn
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(_SQL_INSERT_PROCESSED_EMAIL, [(message_id,) for message_id in message_ids])
+                conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error recording processed emails: {e}")
+                return None
+
+    def is_attachment_processed(self, content_hash):
+        """
+        Check whether an attachment with these contents was already processed.
+        
+        Args:
+            content_hash (str): Hash of the attachment's contents
+        
+        Returns:
+            bool: True if the contents were already processed, False otherwise
+        """
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute(_SQL_SELECT_PROCESSED_ATTACHMENT, (content_hash,))
+                return cursor.fetchone() is not None
+            except Exception as e:
+                self.logger.error(f"Error checking processed attachment: {e}")
+                return False
+
+    def mark_attachment_processed(self, content_hash):
+        """
+        Record an attachment as processed.
+        
+        Args:
+            content_hash (str): Hash of the attachment's contents
+        
+        Returns:
+            int: 1 if the attachment was newly recorded, 0 if identical
+                contents had already been processed, or None if failed
+        """
+        with self._lock:
+            conn = self.conn
+            try:
+                cursor = conn.cursor()
+                cursor.execute(_SQL_INSERT_PROCESSED_ATTACHMENT, (content_hash,))
+                conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error recording processed attachment: {e}")
+                return None
 
     def validate_purchase_order(self, po_number):
         """
@@ -206,22 +690,18 @@ class DatabaseManager:
         Returns:
             bool: True if the purchase order exists, False otherwise
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+        with self._lock:
+            try:
+                conn = self.conn
+                cursor = conn.cursor()
             
-            cursor.execute('''
-            SELECT id FROM purchase_orders WHERE po_number = ? AND status = 'active'
-            ''', (po_number,))
+                cursor.execute(_SQL_VALIDATE_PO, (po_number,))
             
-            result = cursor.fetchone()
-            return result is not None
-        except Exception as e:
-            self.logger.error(f"Error validating purchase order: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+                result = cursor.fetchone()
+                return result is not None
+            except Exception as e:
+                self.logger.error(f"Error validating purchase order: {e}")
+                return False
 
 
     def _format_discrepancies(self, discrepancies):
@@ -237,14 +717,12 @@ class DatabaseManager:
         if not discrepancies:
             return "None found"
         
-        formatted = []
-        for d in discrepancies:
-            if d["field"] == "total_amount":
-                formatted.append(f"- {d['field'].replace('_', ' ').title()}: PO: ${d['po_value']} vs Invoice: ${d['invoice_value']} (Difference: ${d['difference']})")
-            else:
-                formatted.append(f"- {d['field'].replace('_', ' ').title()}: PO: {d['po_value']} vs Invoice: {d['invoice_value']}")
-        
-        return "\n".join(formatted)
+        return "\n".join(
+            _DISCREPANCY_TEMPLATES.get(d["field"], _DEFAULT_DISCREPANCY_TEMPLATE).format(
+                label=d["field"].replace('_', ' ').title(), **d
+            )
+            for d in discrepancies
+        )
 
     def send_validation_report(self, validation_result, invoice_file_path=None):
         """
@@ -263,34 +741,67 @@ class DatabaseManager:
         
         try:
             # Create email message
-            msg = MIMEMultipart()
+            msg = EmailMessage()
             msg['From'] = self.email_address
             msg['To'] = self.approver_email
             msg['Subject'] = f"Invoice Validation Report - {validation_result.get('status').upper()}"
             
             # Email body
             body = validation_result.get('report_content', 'No report content available')
-            msg.attach(MIMEText(body, 'plain'))
+            msg.set_content(body)
             
             # Attach invoice file if available
-            if invoice_file_path and os.path.exists(invoice_file_path):
-                with open(invoice_file_path, 'rb') as file:
-                    attachment = MIMEApplication(file.read(), Name=os.path.basename(invoice_file_path))
-                    attachment['Content-Disposition'] = f'attachment; filename="{os.path.basename(invoice_file_path)}"'
-                    msg.attach(attachment)
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_address, self.email_password)
-                server.send_message(msg)
+            if invoice_file_path:
+                try:
+                    with open(invoice_file_path, 'rb') as file:
+                        data = file.read()
+                except OSError:
+                    data = None
+                if data is not None:
+                    msg.add_attachment(data, maintype='application', subtype='octet-stream',
+                                       filename=os.path.basename(invoice_file_path))
+            
+            # Send email, reconnecting once if the server dropped the idle session
+            with self._smtp_lock:
+                self._smtp.send_message(msg)
             
             self.logger.info(f"Validation report sent to {self.approver_email}")
             return True
         except Exception as e:
+            with self._smtp_lock:
+                self._smtp.close()
             self.logger.error(f"Error sending validation report: {e}")
             return False
 
+    def queue_validation_report(self, validation_result, invoice_file_path=None):
+        """
+        Queue a validation report to be sent to the approver in the background.
+        
+        Args:
+            validation_result (dict): Validation result dictionary
+            invoice_file_path (str): Path to the invoice file
+        """
+        with self._mail_thread_lock:
+            if self._mail_thread is None:
+                self._mail_thread = threading.Thread(target=self._mail_worker, name="validation-mailer", daemon=True)
+                self._mail_thread.start()
+            # Queued under the lock so close() cannot stop the worker in between
+            self._mail_queue.put((validation_result, invoice_file_path))
+
+    def _mail_worker(self):
+        """Send queued validation reports until the None sentinel arrives."""
+        while True:
+            job = self._mail_queue.get()
+            try:
+                if job is None:
+                    break
+                self.send_validation_report(*job)
+            finally:
+                self._mail_queue.task_done()
+        
+        with self._smtp_lock:
+            self._smtp.close()
+
     def update_approval_status(self, report_id, approval_status, comments=None):
         """
         Update the approval status of a validation report.
@@ -303,100 +814,185 @@ class DatabaseManager:
         Returns:
             bool: True if successful, False otherwise
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Update validation report
-            cursor.execute('''
-            UPDATE validation_reports 
-            SET approval_status = ?, 
-                report_content = report_content || ? 
-            WHERE id = ?
-            ''', (
-                approval_status,
-                f"\n\nApprover Comments: {comments}" if comments else "\n\nApproved without comments",
-                report_id
-            ))
-            
-            # Get invoice ID from the report
-            cursor.execute('SELECT invoice_id FROM validation_reports WHERE id = ?', (report_id,))
-            invoice_id = cursor.fetchone()[0]
-            
-            # Update invoice status based on approval
-            if approval_status == 'approved':
-                cursor.execute('UPDATE invoices SET status = ? WHERE id = ?', ('approved', invoice_id))
-            else:
-                cursor.execute('UPDATE invoices SET status = ? WHERE id = ?', ('rejected', invoice_id))
-            
-            conn.commit()
+        updated = self.update_approval_statuses_bulk([(report_id, approval_status, comments)])
+        if updated:
             self.logger.info(f"Updated approval status for report {report_id} to {approval_status}")
-            return True
-        except Exception as e:
-            self.logger.error(f"Error updating approval status: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+        return bool(updated)
+
+    def update_approval_statuses_bulk(self, updates):
+        """
+        Update the approval status of several validation reports in a single
+        transaction.
+        
+        Args:
+            updates (list): (report_id, approval_status, comments) tuples, as
+                accepted by update_approval_status
+        
+        Returns:
+            int: Number of reports updated, or None if failed
+        """
+        report_rows = [(
+            approval_status,
+            f"\n\nApprover Comments: {comments}" if comments else "\n\nApproved without comments",
+            report_id
+        ) for report_id, approval_status, comments in updates]
+        
+        # Update each report's invoice status based on the approval
+        invoice_rows = [
+            ('approved' if approval_status == 'approved' else 'rejected', report_id)
+            for report_id, approval_status, _ in updates
+        ]
+        
+        with self._lock:
+            conn = self.conn
+            try:
+                self._pending_cache = None
+                cursor = conn.cursor()
+                cursor.executemany(_SQL_UPDATE_REPORT_STATUS, report_rows)
+                updated = cursor.rowcount
+                cursor.executemany(_SQL_UPDATE_REPORT_INVOICE_STATUS, invoice_rows)
+                conn.commit()
+                return updated
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error updating approval statuses: {e}")
+                return None
 
-    def generate_summary_report(self, start_date=None, end_date=None):
+    def _date_range_filter(self, start_date=None, end_date=None):
+        """
+        Build the WHERE clause shared by the summary report queries.
+
+        Args:
+            start_date (str): Optional start date for filtering (YYYY-MM-DD)
+            end_date (str): Optional end date for filtering (YYYY-MM-DD)
+
+        Returns:
+            tuple: (where clause, list of query parameters)
+        """
+        conditions = []
+        params = []
+
+        if start_date:
+            conditions.append("i.created_at >= ?")
+            params.append(start_date)
+
+        if end_date:
+            conditions.append("i.created_at <= ?")
+            params.append(end_date)
+
+        if not conditions:
+            return "", params
+        return " WHERE " + " AND ".join(conditions), params
+
+    def _summary_report_query(self, start_date=None, end_date=None):
+        """
+        Build the summary report query for an optional date range.
+        
+        Args:
+            start_date (str): Optional start date for filtering (YYYY-MM-DD)
+            end_date (str): Optional end date for filtering (YYYY-MM-DD)
+        
+        Returns:
+            tuple: (query, list of query parameters)
+        """
+        where, params = self._date_range_filter(start_date, end_date)
+        return _SQL_SUMMARY_REPORT + where + " ORDER BY i.created_at DESC", params
+
+    def generate_summary_report(self, start_date=None, end_date=None, dtype=None):
         """
         Generate a summary report of invoices and their validation status.
         
         Args:
             start_date (str): Optional start date for filtering (YYYY-MM-DD)
             end_date (str): Optional end date for filtering (YYYY-MM-DD)
+            dtype (dict): Optional column dtypes, e.g. {'status': 'category'}
+        
+        The most recent report is cached until the date range changes or the
+        database does, from this connection or any other; callers get their
+        own copy.
         
         Returns:
             pandas.DataFrame: Summary report as a DataFrame
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            
-            query = '''
-            SELECT 
-                i.invoice_number,
-                i.po_number,
-                i.vendor_name,
-                i.invoice_date,
-                i.total_amount,
-                i.status,
-                i.validation_result,
-                vr.approval_status
-            FROM 
-                invoices i
-            LEFT JOIN 
-                validation_reports vr ON i.id = vr.invoice_id
-            '''
-            
-            params = []
-            if start_date or end_date:
-                query += " WHERE "
-                conditions = []
-                
-                if start_date:
-                    conditions.append("i.created_at >= ?")
-                    params.append(start_date)
-                
-                if end_date:
-                    conditions.append("i.created_at <= ?")
-                    params.append(end_date)
-                
-                query += " AND ".join(conditions)
-            
-            query += " ORDER BY i.created_at DESC"
-            
-            df = pd.read_sql_query(query, conn, params=params)
-            self.logger.info("Generated summary report")
-            return df
-        except Exception as e:
-            self.logger.error(f"Error generating summary report: {e}")
-            return pd.DataFrame()
-        finally:
-            if conn:
-                conn.close()
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                # Fetch plain tuples in large batches rather than going through
+                # pandas' SQL layer
+                cursor.row_factory = None
+                cursor.arraysize = 10000
+            
+                # total_changes counts this connection's writes and
+                # data_version moves when another connection commits
+                cursor.execute(_SQL_DATA_VERSION)
+                stamp = (self.conn.total_changes, cursor.fetchone()[0])
+                cached = self._summary_cache
+                if cached is not None and cached[:2] == ((start_date, end_date), stamp):
+                    df = cached[2].copy()
+                else:
+                    cursor.execute(*self._summary_report_query(start_date, end_date))
+            
+                    rows = cursor.fetchall()
+                    if rows:
+                        columns = [description[0] for description in cursor.description]
+                        df = pd.DataFrame.from_records(rows, columns=columns)
+                    else:
+                        df = _EMPTY_SUMMARY_REPORT.copy()
+                    self._summary_cache = ((start_date, end_date), stamp, df.copy())
+                if dtype:
+                    df = df.astype(dtype)
+                self.logger.info("Generated summary report")
+                return df
+            except Exception as e:
+                self.logger.error(f"Error generating summary report: {e}")
+                return pd.DataFrame()
+
+    def stream_summary_report(self, output_path, start_date=None, end_date=None):
+        """
+        Write the summary report straight to CSV without building a DataFrame.
+        
+        Rows are fetched and written in chunks, so memory use does not grow
+        with the size of the report. Paths ending in .gz are gzip-compressed.
+        
+        Args:
+            output_path (str): Path to save the CSV file
+            start_date (str): Optional start date for filtering (YYYY-MM-DD)
+            end_date (str): Optional end date for filtering (YYYY-MM-DD)
+        
+        Returns:
+            int: Number of rows written, or None if failed. Nothing is
+                written when the report is empty.
+        """
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(*self._summary_report_query(start_date, end_date))
+            
+                chunk = cursor.fetchmany(10000)
+                if not chunk:
+                    return 0
+            
+                if output_path.endswith('.gz'):
+                    f = gzip.open(output_path, 'wt', newline='')
+                else:
+                    f = open(output_path, 'w', newline='', buffering=1 << 20)
+            
+                row_count = 0
+                with f:
+                    writer = csv.writer(f)
+                    writer.writerow(description[0] for description in cursor.description)
+                    while chunk:
+                        writer.writerows(chunk)
+                        row_count += len(chunk)
+                        chunk = cursor.fetchmany(10000)
+            
+                return row_count
+            except Exception as e:
+                self.logger.error(f"Error streaming summary report: {e}")
+                return None
 
-    def export_summary_report(self, output_path, start_date=None, end_date=None):
+    def export_summary_report(self, output_path, start_date=None, end_date=None, df=None):
         """
         Export a summary report to CSV.
         
@@ -404,22 +1000,31 @@ class DatabaseManager:
             output_path (str): Path to save the CSV file
             start_date (str): Optional start date for filtering (YYYY-MM-DD)
             end_date (str): Optional end date for filtering (YYYY-MM-DD)
+            df (pandas.DataFrame): Optional report already returned by
+                generate_summary_report, written as is instead of querying
+                the database again; the dates are then ignored
         
         Returns:
             bool: True if successful, False otherwise
         """
-        try:
-            df = self.generate_summary_report(start_date, end_date)
-            if df.empty:
-                self.logger.warning("No data to export")
+        if df is not None:
+            row_count = len(df)
+            if row_count:
+                try:
+                    df.to_csv(output_path, index=False)
+                except Exception as e:
+                    self.logger.error(f"Error exporting summary report: {e}")
+                    return False
+        else:
+            row_count = self.stream_summary_report(output_path, start_date, end_date)
+            if row_count is None:
                 return False
-            
-            df.to_csv(output_path, index=False)
-            self.logger.info(f"Exported summary report to {output_path}")
-            return True
-        except Exception as e:
-            self.logger.error(f"Error exporting summary report: {e}")
+        if not row_count:
+            self.logger.warning("No data to export")
             return False
+        
+        self.logger.info(f"Exported summary report to {output_path}")
+        return True
 
     def get_invoice_details(self, invoice_id):
         """
@@ -431,91 +1036,123 @@ class DatabaseManager:
         Returns:
             dict: Invoice details
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT 
-                i.id, i.invoice_number, i.po_number, i.vendor_name, 
-                i.invoice_date, i.total_amount, i.file_path, i.status, 
-                i.validation_result, i.created_at,
-                vr.id as report_id, vr.report_content, vr.approval_status
-            FROM 
-                invoices i
-            LEFT JOIN 
-                validation_reports vr ON i.id = vr.invoice_id
-            WHERE 
-                i.id = ?
-            ''', (invoice_id,))
-            
-            row = cursor.fetchone()
-            if not row:
-                return None
+        with self._lock:
+            try:
+                conn = self.conn
+                cursor = conn.cursor()
             
-            column_names = [description[0] for description in cursor.description]
-            invoice_details = dict(zip(column_names, row))
+                cursor.execute(_SQL_INVOICE_DETAILS, (invoice_id,))
             
-            return invoice_details
-        except Exception as e:
-            self.logger.error(f"Error getting invoice details: {e}")
-            return None
-        finally:
-            if conn:
-                conn.close()
+                row = cursor.fetchone()
+                if not row:
+                    return None
+            
+                return dict(row)
+            except Exception as e:
+                self.logger.error(f"Error getting invoice details: {e}")
+                return None
+
+    def get_validation_report(self, report_id):
+        """
+        Get a validation report together with its invoice.
+        
+        Args:
+            report_id (int): ID of the validation report
+        
+        Returns:
+            dict: Report and invoice details, or None if not found
+        """
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute(_SQL_VALIDATION_REPORT, (report_id,))
+            
+                row = cursor.fetchone()
+                if not row:
+                    return None
+            
+                return dict(row)
+            except Exception as e:
+                self.logger.error(f"Error getting validation report: {e}")
+                return None
 
     def get_pending_approvals(self):
         """
         Get a list of validation reports that require approval.
         
+        The list is cached. Approval requests created by validate_invoice
+        are added to it directly; approval updates, or a commit from another
+        connection, make the next call reload it.
+        
         Returns:
             list: List of reports requiring approval
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT 
-                vr.id as report_id,
-                i.invoice_number,
-                i.po_number,
-                i.vendor_name,
-                i.total_amount,
-                i.file_path,
-                vr.created_at
-            FROM 
-                validation_reports vr
-            JOIN 
-                invoices i ON vr.invoice_id = i.id
-            WHERE 
-                vr.approval_status = 'requires_approval'
-            ORDER BY 
-                vr.created_at DESC
-            ''')
-            
-            column_names = [description[0] for description in cursor.description]
-            pending_approvals = []
-            
-            for row in cursor.fetchall():
-                pending_approvals.append(dict(zip(column_names, row)))
-            
-            return pending_approvals
-        except Exception as e:
-            self.logger.error(f"Error getting pending approvals: {e}")
-            return []
-        finally:
-            if conn:
-                conn.close()
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute(_SQL_DATA_VERSION)
+                data_version = cursor.fetchone()[0]
+                if self._pending_cache is None or self._pending_cache[0] != data_version:
+                    cursor.execute(_SQL_PENDING_APPROVALS)
+                    self._pending_cache = (data_version, [dict(row) for row in cursor.fetchall()])
+                # Callers get their own dicts to modify
+                return [dict(approval) for approval in self._pending_cache[1]]
+            except Exception as e:
+                self.logger.error(f"Error getting pending approvals: {e}")
+                return []
+
+    @property
+    def conn(self):
+        """
+        Long-lived database connection, reopened if it was closed.
+        
+        Returns:
+            sqlite3.Connection: The shared database connection
+        """
+        if self._conn is None:
+            self._conn = self._open_connection()
+        return self._conn
+
+    def _open_connection(self):
+        """
+        Open and configure a database connection and register its finalizer.
+        
+        The finalizer only holds a weak reference to the manager, so it does
+        not keep the manager alive until exit the way atexit.register(self.close)
+        would. It runs when the manager is collected or at interpreter exit.
+        
+        Returns:
+            sqlite3.Connection: The new connection
+        """
+        conn = _configure_conn(sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256))
+        self._finalizer = weakref.finalize(self, _finalize_manager, weakref.ref(self), conn, self.logger)
+        return conn
+
+    def close(self):
+        """Send any queued validation reports, then optimize and close the database connection."""
+        with self._mail_thread_lock:
+            if self._mail_thread is not None:
+                self._mail_queue.put(None)
+                self._mail_thread.join()
+                self._mail_thread = None
+        
+        with self._lock:
+            if self._conn is not None:
+                self._finalizer.detach()
+                _close_connection(self._conn, self.logger)
+                self._conn = None
+                # Cached results are stamped with this connection's counters
+                self._summary_cache = None
+                self._pending_cache = None
 
     def _get_connection(self):
         """
         Get a database connection.
         
         Returns:
-            sqlite3.Connection: A database connection
+            sqlite3.Connection: The shared database connection
         """
-        return sqlite3.connect(self.db_path)
+        return self.conn
     
     def get_invoice_id_by_number(self, invoice_number):
         """
@@ -527,22 +1164,18 @@ class DatabaseManager:
         Returns:
             int: The invoice ID, or None if not found
         """
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+        with self._lock:
+            try:
+                conn = self.conn
+                cursor = conn.cursor()
             
-            cursor.execute('''
-            SELECT id FROM invoices WHERE invoice_number = ?
-            ''', (invoice_number,))
+                cursor.execute(_SQL_GET_INVOICE_ID, (invoice_number,))
             
-            result = cursor.fetchone()
-            return result[0] if result else None
-        except Exception as e:
-            self.logger.error(f"Error getting invoice ID by number: {e}")
-            return None
-        finally:
-            if conn:
-                conn.close()
+                result = cursor.fetchone()
+                return result[0] if result else None
+            except Exception as e:
+                self.logger.error(f"Error getting invoice ID by number: {e}")
+                return None
 
     def validate_invoice(self, invoice_identifier):
         """
@@ -562,127 +1195,231 @@ class DatabaseManager:
                 self.logger.error(f"Invoice with number {invoice_identifier} not found")
                 return {"status": "error", "message": f"Invoice with number {invoice_identifier} not found"}
         
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get invoice details
-            cursor.execute('''
-            SELECT invoice_number, po_number, vendor_name, total_amount, file_path
-            FROM invoices WHERE id = ?
-            ''', (invoice_id,))
-            
-            invoice = cursor.fetchone()
-            if not invoice:
-                self.logger.error(f"Invoice with ID {invoice_id} not found")
-                return None
-            
-            invoice_number, po_number, invoice_vendor, invoice_amount, file_path = invoice
-            
-            # Get purchase order details
-            cursor.execute('''
-            SELECT vendor_name, total_amount
-            FROM purchase_orders WHERE po_number = ?
-            ''', (po_number,))
-            
-            po = cursor.fetchone()
-            if not po:
-                # Update invoice status to indicate PO not found
-                cursor.execute('''
-                UPDATE invoices SET status = 'error', validation_result = 'Purchase order not found'
-                WHERE id = ?
-                ''', (invoice_id,))
+        with self._lock:
+            try:
+                conn = self.conn
+                cursor = conn.cursor()
+            
+                # Get invoice and purchase order details in one query; the vendor
+                # names are compared case-insensitively by SQLite. The explicit
+                # COLLATE covers databases created before the column collation.
+                cursor.execute(_SQL_VALIDATE_INVOICE, (invoice_id,))
+            
+                invoice = cursor.fetchone()
+                if not invoice:
+                    self.logger.error(f"Invoice with ID {invoice_id} not found")
+                    return None
+            
+                validation_result, file_path, pending_approval = self._record_validation(cursor, invoice)
+                conn.commit()
+                if pending_approval:
+                    self._add_pending_approvals([pending_approval])
+            
+                # Send report to approver if discrepancies found
+                if validation_result.get("discrepancies") and self.approver_email:
+                    self.queue_validation_report(validation_result, file_path)
+            
+                return validation_result
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error validating invoice: {e}")
+                return {"status": "error", "message": str(e)}
+
+    def validate_invoices_bulk(self, invoice_identifiers):
+        """
+        Validate several invoices against their purchase orders at once.
+        
+        The invoices and their purchase orders are read with one query per
+        500 invoices, and all results are written in a single transaction.
+        
+        Args:
+            invoice_identifiers (list): Invoice IDs (int) and/or invoice
+                numbers (str)
+        
+        Returns:
+            dict: Validation results keyed by the identifiers passed in, as
+                returned by validate_invoice
+        """
+        invoice_ids = list(dict.fromkeys(i for i in invoice_identifiers if not isinstance(i, str)))
+        invoice_numbers = list(dict.fromkeys(i for i in invoice_identifiers if isinstance(i, str)))
+        
+        with self._lock:
+            conn = self.conn
+            try:
+                cursor = conn.cursor()
+            
+                invoices = []
+                for column, values in (('i.id', invoice_ids), ('i.invoice_number', invoice_numbers)):
+                    # Stay well below SQLite's limit on bound parameters
+                    for start in range(0, len(values), 500):
+                        chunk = values[start:start + 500]
+                        placeholders = ', '.join('?' * len(chunk))
+                        cursor.execute(f"{_SQL_VALIDATE_INVOICES}WHERE {column} IN ({placeholders})", chunk)
+                        invoices.extend(cursor.fetchall())
+            
+                results = {}
+                to_mail = []
+                pending_approvals = []
+                for invoice in invoices:
+                    # An invoice passed by both ID and number is validated once
+                    if invoice[0] in results:
+                        continue
+                    validation_result, file_path, pending_approval = self._record_validation(cursor, invoice)
+                    results[invoice[0]] = results[invoice[1]] = validation_result
+                    if pending_approval:
+                        to_mail.append((validation_result, file_path))
+                        pending_approvals.append(pending_approval)
                 conn.commit()
-                
-                self.logger.warning(f"Purchase order {po_number} not found for invoice {invoice_number}")
-                return {"status": "error", "message": "Purchase order not found"}
-            
-            po_vendor, po_amount = po
-            
-            # Check for discrepancies
-            discrepancies = []
-            
-            if po_vendor and invoice_vendor and po_vendor.lower() != invoice_vendor.lower():
-                discrepancies.append({
-                    "field": "vendor_name",
-                    "po_value": po_vendor,
-                    "invoice_value": invoice_vendor
-                })
-            
-            if po_amount and invoice_amount and abs(float(po_amount) - float(invoice_amount)) > 0.01:
-                discrepancies.append({
-                    "field": "total_amount",
-                    "po_value": po_amount,
-                    "invoice_value": invoice_amount,
-                    "difference": abs(float(po_amount) - float(invoice_amount))
-                })
-            
-            # Determine validation status
-            if discrepancies:
-                status = "discrepancies_found"
-                validation_result = "Discrepancies found between invoice and purchase order"
+                self._add_pending_approvals(pending_approvals)
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error validating invoices: {e}")
+                return {identifier: {"status": "error", "message": str(e)} for identifier in invoice_identifiers}
+        
+        if self.approver_email:
+            for validation_result, file_path in to_mail:
+                self.queue_validation_report(validation_result, file_path)
+        
+        validation_results = {}
+        for identifier in invoice_identifiers:
+            if identifier in results:
+                validation_results[identifier] = results[identifier]
             else:
-                status = "validated"
-                validation_result = "Invoice matches purchase order"
-            
-            # Update invoice status
-            cursor.execute('''
-            UPDATE invoices SET status = ?, validation_result = ?
-            WHERE id = ?
-            ''', (status, validation_result, invoice_id))
-            
-            # Create validation report
-            report_content = f"""
-            Invoice Validation Report
-            -------------------------
-            Invoice Number: {invoice_number}
-            Purchase Order: {po_number}
-            Validation Status: {status}
-            
-            Details:
-            - Invoice Vendor: {invoice_vendor}
-            - PO Vendor: {po_vendor}
-            - Invoice Amount: ${invoice_amount}
-            - PO Amount: ${po_amount}
-            
-            Discrepancies:
-            {self._format_discrepancies(discrepancies) if discrepancies else "None found"}
-            """
-            
-            cursor.execute('''
-            INSERT INTO validation_reports (invoice_id, report_content, discrepancies, approval_status)
-            VALUES (?, ?, ?, ?)
-            ''', (
-                invoice_id,
-                report_content,
-                str(discrepancies) if discrepancies else None,
-                "requires_approval" if discrepancies else "auto_approved"
-            ))
-            
-            report_id = cursor.lastrowid
-            conn.commit()
-            
-            validation_result = {
+                kind = "number" if isinstance(identifier, str) else "ID"
+                message = f"Invoice with {kind} {identifier} not found"
+                self.logger.error(message)
+                validation_results[identifier] = {"status": "error", "message": message}
+        return validation_results
+
+    def _record_validation(self, cursor, invoice):
+        """
+        Compare an invoice with its purchase order and store the outcome.
+        
+        The caller commits the writes.
+        
+        Args:
+            cursor (sqlite3.Cursor): Cursor inside the caller's transaction
+            invoice (tuple): Row of the invoice validation query
+        
+        Returns:
+            tuple: (validation result dict, invoice file path, pending
+                approval dict or None if no approval is needed)
+        """
+        (invoice_id, invoice_number, po_number, invoice_vendor, invoice_amount, file_path,
+         po_id, po_vendor, po_amount, vendor_differs) = invoice
+        
+        if po_id is None:
+            # Update invoice status to indicate PO not found
+            cursor.execute(_SQL_MARK_PO_NOT_FOUND, (invoice_id,))
+            self.logger.warning(f"Purchase order {po_number} not found for invoice {invoice_number}")
+            return {"status": "error", "message": "Purchase order not found"}, file_path, None
+        
+        # Check for discrepancies
+        discrepancies = []
+        
+        if po_vendor and invoice_vendor and vendor_differs:
+            discrepancies.append({
+                "field": "vendor_name",
+                "po_value": po_vendor,
+                "invoice_value": invoice_vendor
+            })
+        
+        if po_amount and invoice_amount and abs(float(po_amount) - float(invoice_amount)) > 0.01:
+            discrepancies.append({
+                "field": "total_amount",
+                "po_value": po_amount,
+                "invoice_value": invoice_amount,
+                "difference": abs(float(po_amount) - float(invoice_amount))
+            })
+        
+        # Determine validation status
+        if discrepancies:
+            status = "discrepancies_found"
+            validation_result = "Discrepancies found between invoice and purchase order"
+        else:
+            status = "validated"
+            validation_result = "Invoice matches purchase order"
+        
+        # Only reports that need an approver get the full write-up
+        if discrepancies:
+            report_content = _REPORT_TEMPLATE.format_map({
+                "invoice_number": invoice_number,
+                "po_number": po_number,
                 "status": status,
-                "invoice_id": invoice_id,
+                "invoice_vendor": invoice_vendor,
+                "po_vendor": po_vendor,
+                "invoice_amount": invoice_amount,
+                "po_amount": po_amount,
+                "discrepancies": self._format_discrepancies(discrepancies),
+            })
+        else:
+            report_content = validation_result
+        
+        # Update invoice status and create the report in the caller's
+        # transaction, with nothing else running between the two writes
+        cursor.execute(_SQL_UPDATE_VALIDATION, (status, validation_result, invoice_id))
+        
+        cursor.execute(_SQL_INSERT_REPORT, (
+            invoice_id,
+            report_content,
+            json.dumps(discrepancies) if discrepancies else None,
+            "requires_approval" if discrepancies else "auto_approved"
+        ))
+        
+        report_id, created_at = cursor.fetchone()
+        
+        # Reports that need an approver, as get_pending_approvals lists them
+        pending_approval = None
+        if discrepancies:
+            pending_approval = {
                 "report_id": report_id,
-                "discrepancies": discrepancies,
-                "report_content": report_content
+                "invoice_number": invoice_number,
+                "po_number": po_number,
+                "vendor_name": invoice_vendor,
+                "total_amount": invoice_amount,
+                "file_path": file_path,
+                "created_at": created_at
             }
-            
-            # Send report to approver if discrepancies found
-            if discrepancies and self.approver_email:
-                self.send_validation_report(validation_result, file_path)
-            
-            return validation_result
-        except Exception as e:
-            self.logger.error(f"Error validating invoice: {e}")
-            return {"status": "error", "message": str(e)}
-        finally:
-            if conn:
-                conn.close()
+        
+        return {
+            "status": status,
+            "invoice_id": invoice_id,
+            "report_id": report_id,
+            "discrepancies": discrepancies,
+            "report_content": report_content
+        }, file_path, pending_approval
+
+    def _add_pending_approvals(self, approvals):
+        """
+        Put newly committed approval requests at the front of the cached
+        pending approvals, saving get_pending_approvals a reload.
+        
+        Args:
+            approvals (list): Pending approval dicts, oldest first
+        """
+        if self._pending_cache is not None and approvals:
+            self._pending_cache[1][:0] = approvals[::-1]
+
+def _view_query(table_name, where=None, limited=False):
+    """
+    Build the SELECT used by view_database.
+    
+    Args:
+        table_name (str): Table name, already checked against sqlite_master
+        where (str): Optional WHERE clause with ? placeholders
+        limited (bool): Whether a bound LIMIT is appended
+    
+    Returns:
+        str: The query text
+    """
+    query = f'SELECT * FROM "{table_name}"'
+    if where:
+        query += f" WHERE {where}"
+    if limited:
+        query += " LIMIT ?"
+    return query
 
-def view_database(db_path='./invoices.db', table=None, limit=None, where=None):
+def view_database(db_path='./invoices.db', table=None, limit=None, where=None, params=None):
     """
     View the contents of the database tables with formatted output.
     
@@ -690,62 +1427,72 @@ def view_database(db_path='./invoices.db', table=None, limit=None, where=None):
         db_path (str): Path to the database file
         table (str): Optional specific table to view (purchase_orders, invoices, validation_reports)
         limit (int): Optional limit on the number of rows to display
-        where (str): Optional WHERE clause for filtering results
+        where (str): Optional WHERE clause for filtering results, using ? placeholders
+        params (list): Optional values bound to the placeholders in where
     """
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
+        conn = _configure_conn(sqlite3.connect(db_path))
         cursor = conn.cursor()
         
-        # Get list of tables if no specific table is requested
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        known_tables = [row[0] for row in cursor.fetchall()]
+        
+        # Only table names that exist are ever interpolated into the query
         if table is None:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = [row[0] for row in cursor.fetchall()]
-        else:
+            # Skip SQLite's internal tables, e.g. sqlite_stat1 from ANALYZE
+            tables = [name for name in known_tables if not name.startswith('sqlite_')]
+        elif table in known_tables:
             tables = [table]
+        else:
+            print(f"Unknown table: {table}")
+            return
         
         for table_name in tables:
             print(f"\n{'=' * 80}")
             print(f"TABLE: {table_name.upper()}")
             print(f"{'=' * 80}")
             
-            # Get column names
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            # Build query with optional WHERE clause and LIMIT
-            query = f"SELECT * FROM {table_name}"
-            params = []
-            
-            if where:
-                query += f" WHERE {where}"
+            # Build query with optional WHERE clause and LIMIT, binding values
+            query = _view_query(table_name, where, bool(limit))
+            query_params = list(params or [])
             
             if limit:
-                query += f" LIMIT {limit}"
-            
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            if not rows:
+                query_params.append(int(limit))
+            
+            cursor.arraysize = 1000
+            cursor.execute(query, query_params)
+            columns = [description[0] for description in cursor.description]
+            
+            # Format every cell once, tracking the widest non-null value per column
+            data_widths = [0] * len(columns)
+            formatted_rows = []
+            while True:
+                chunk = cursor.fetchmany()
+                if not chunk:
+                    break
+                for row in chunk:
+                    cells = [str(value) for value in row]
+                    for i, value in enumerate(row):
+                        if value is not None and len(cells[i]) > data_widths[i]:
+                            data_widths[i] = len(cells[i])
+                    formatted_rows.append(cells)
+            
+            if not formatted_rows:
                 print("No records found.")
                 continue
             
-            # Calculate column widths for formatting
-            col_widths = {}
-            for col in columns:
-                col_widths[col] = max(len(col), max([len(str(row[col])) for row in rows if row[col] is not None] or [0]) + 2)
+            col_widths = [max(len(col), width + 2) for col, width in zip(columns, data_widths)]
             
             # Print header
-            header = " | ".join(col.ljust(col_widths[col]) for col in columns)
+            header = " | ".join(col.ljust(width) for col, width in zip(columns, col_widths))
             print(header)
             print("-" * len(header))
             
             # Print rows
-            for row in rows:
-                row_str = " | ".join(str(row[col]).ljust(col_widths[col]) for col in columns)
-                print(row_str)
+            for cells in formatted_rows:
+                print(" | ".join(cell.ljust(width) for cell, width in zip(cells, col_widths)))
             
-            print(f"\nTotal records: {len(rows)}")
+            print(f"\nTotal records: {len(formatted_rows)}")
     
     except Exception as e:
         print(f"Error viewing database: {e}")
@@ -2,19 +2,29 @@ import imaplib
 import email
 import os
 import re
+import ssl
+import socket
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime, timedelta
 import time
+import csv
 import json
+import queue
+import atexit
+import hashlib
+import html
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from email.header import decode_header
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-import smtplib
 from PyPDF2 import PdfReader
 from dotenv import load_dotenv  # Import dotenv to load environment variables
-from database_manager import DatabaseManager
+from database_manager import DatabaseManager, SMTPSession
 import pytesseract
 from PIL import Image
 
@@ -24,8 +34,240 @@ load_dotenv(os.path.join("venv\credentials.env"))
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
+# OCR runs one page per worker process; keep Tesseract single-threaded so
+# its own threads do not compete with the pool
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
 # This helps maintain a history of operations
 
+def _ocr_pdf_page(pdf_path, page_number):
+    """
+    Render a single PDF page and OCR it. Runs in a worker process, so only
+    one page image is held in memory per worker.
+    
+    PyMuPDF renders the page in-process when it is installed; otherwise
+    pdf2image runs Poppler in a subprocess.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        page_number (int): 1-based page number
+    
+    Returns:
+        str: Text recognized on the page
+    """
+    try:
+        import fitz
+    except ImportError:
+        from pdf2image import convert_from_path
+        pages = convert_from_path(pdf_path, first_page=page_number, last_page=page_number)
+        return "".join(pytesseract.image_to_string(page) for page in pages)
+
+    # 200 dpi matches pdf2image's default, so OCR sees the same resolution
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc[page_number - 1].get_pixmap(dpi=200)
+    image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+    return pytesseract.image_to_string(image)
+
+# Invoice field patterns, compiled once. Each field tries its primary pattern
+# first and only falls back to the looser alternative when that misses.
+_RE_INVOICE_NUMBER = re.compile(r'invoice\s*#\s*(\w+)', re.IGNORECASE)
+_RE_INVOICE_NUMBER_ALT = re.compile(r'invoice\s*(?:no|number|num)[.:\s]*(\w+[-\w]*)', re.IGNORECASE)
+_RE_PURCHASE_ORDER = re.compile(r'purchase\s*order\s*#\s*(\w+)', re.IGNORECASE)
+_RE_PURCHASE_ORDER_ALT = re.compile(r'(?:po|p\.o\.|purchase\s*order)[.:\s#]*(\w+[-\w]*)', re.IGNORECASE)
+_RE_TOTAL_AMOUNT = re.compile(r'total\s*amount\s*[:$]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE)
+_RE_TOTAL_AMOUNT_ALT = re.compile(r'(?:total|amount\s*due|balance\s*due|grand\s*total)[.:\s]*[$€£]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE)
+_RE_DATE = re.compile(r'\b\d{1,2}/\d{1,2}/\d{4}\b')
+_RE_INVOICE_DATE_ALT = re.compile(r'(?:invoice|bill|statement)\s*date[.:\s]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\w+\s+\d{1,2},?\s+\d{4})', re.IGNORECASE)
+_RE_VENDOR = re.compile(r'(?:vendor|supplier|from|bill\s*from|sold\s*by)[.:\s]*([A-Za-z0-9\s.,&]+?)(?:\n|Inc\.|\bLLC\b|\bLtd\b|\bCorp\.?\b)', re.IGNORECASE)
+_RE_SENDER_NAME = re.compile(r'([^<@]+)@')
+_RE_DUE_DATE = re.compile(r'(?:due|payment\s*due|due\s*date)[.:\s]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\w+\s+\d{1,2},?\s+\d{4})', re.IGNORECASE)
+_RE_TAX = re.compile(r'(?:tax|vat|gst)[.:\s]*[$€£]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE)
+_RE_SUBTOTAL = re.compile(r'(?:subtotal|sub\s*total)[.:\s]*[$€£]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE)
+_RE_CURRENCY = re.compile(r'(?:currency|in)[.:\s]*(USD|EUR|GBP|JPY|CAD|AUD|CHF)', re.IGNORECASE)
+
+# CSV log of detected invoices
+_INVOICE_LOG_CSV = './invoice_log.csv'
+_INVOICE_LOG_FIELDS = ['filepath', 'filename', 'detected_at', 'invoice_number', 'total_amount', 'date']
+
+# Attachment types that are checked for invoices
+_ATTACHMENT_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp')
+
+# Image types that always hold a single page, so batched OCR output maps
+# back one page per file; multi-frame TIFFs are OCR'd on their own
+_BATCH_OCR_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# Invoice keywords, each paired with the longer keywords that contain it; the
+# longer ones are only scanned for when the shorter one is present. The most
+# common keywords come first so invoices reach the match threshold early
+_INVOICE_KEYWORD_GROUPS = (
+    ('invoice', ('tax invoice', 'invoice number', 'invoice date', 'invoice total')),
+    ('total amount', ()), ('purchase order', ()), ('amount due', ()), ('due date', ()),
+    ('bill', ('billing date',)),
+    ('receipt', ()), ('statement', ()), ('subtotal', ()), ('payment due', ()),
+    ('charges', ()), ('order number', ()), ('balance due', ()),
+    ('payment terms', ()), ('total due', ()), ('account number', ()), ('customer id', ()),
+    ('VAT', ()), ('GST', ()),
+)
+
+# HTML email bodies: script and style blocks, the remaining tags, and the
+# runs of spaces (including &nbsp;) left where tags are removed
+_RE_HTML_SCRIPT_STYLE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_RE_HTML_TAG = re.compile(r'<[^>]+>')
+_RE_HTML_SPACES = re.compile(r'[ \t\xa0]+')
+
+def _strip_html(markup):
+    """Reduce an HTML body to its text for keyword detection."""
+    text = _RE_HTML_TAG.sub(' ', _RE_HTML_SCRIPT_STYLE.sub(' ', markup))
+    return _RE_HTML_SPACES.sub(' ', html.unescape(text))
+
+def _imap_or(criteria):
+    """Join IMAP search keys with OR, which takes exactly two operands."""
+    query = criteria[-1]
+    for criterion in reversed(criteria[:-1]):
+        query = f'OR {criterion} {query}'
+    return query
+
+# Unread emails whose body could pass is_potential_invoice, which needs at
+# least one keyword; the server filters out the rest before anything is
+# fetched. Uppercase keywords never match the lowercased text and are left out.
+# This is opt-in because it can lose invoices: servers that match the raw
+# base64 or quoted-printable body miss encoded emails, and servers that match
+# whole words (Gmail among them) miss e.g. "billing" or "invoices", which
+# is_potential_invoice finds as substrings. By default the plain UNSEEN search
+# is used and is_potential_invoice does all the filtering
+_SEARCH_UNSEEN_INVOICES = '(UNSEEN {})'.format(_imap_or(
+    [f'BODY "{keyword}"' for keyword, _ in _INVOICE_KEYWORD_GROUPS if keyword.islower()]
+))
+_SEARCH_UNSEEN = '(UNSEEN)'
+
+# Invoice reference and total checks used by is_potential_invoice on lowercased text
+_RE_INVOICE_REF = re.compile(r'invoice\s*#\s*\w+')
+_RE_TOTAL_REF = re.compile(r'total\s*[:$]?\s*\d+')
+
+# Emails fetched in full per UID FETCH round trip
+_FETCH_CHUNK_SIZE = 20
+
+# Times an email may fail processing before it is flagged seen and given up on,
+# so one bad message cannot hold up the rest of the mailbox
+_MAX_EMAIL_ATTEMPTS = 3
+
+# Pieces of UID FETCH responses: the start of each message's response, its
+# UID, and the attachment name parameters of a BODYSTRUCTURE; the last only
+# matches names sent as plain quoted strings
+_RE_FETCH_START = re.compile(rb'\d+ \(')
+_RE_FETCH_UID = re.compile(rb'\bUID (\d+)')
+_RE_BODYSTRUCTURE_NAME_PARAM = re.compile(rb'"(?:FILE)?NAME[*0-9]*"', re.IGNORECASE)
+_RE_BODYSTRUCTURE_NAME = re.compile(rb'"(?:FILE)?NAME" "([^"\\]*)"', re.IGNORECASE)
+
+def _fetched_messages(data):
+    """
+    Pair each message in a UID FETCH (BODY.PEEK[]) response with its UID.
+    
+    imaplib returns each message as an (envelope, literal) tuple followed by
+    the rest of its response as plain bytes; servers may send the UID before
+    or after the literal, so both parts are searched.
+    
+    Args:
+        data (list): Response data from mail.uid('fetch', ...)
+        
+    Returns:
+        list: (uid, raw message) tuples; uid is bytes, or None if missing
+    """
+    messages = []
+    for piece in data:
+        literal = None
+        if isinstance(piece, tuple):
+            piece, literal = piece
+        if not isinstance(piece, bytes):
+            continue
+        if _RE_FETCH_START.match(piece) or not messages:
+            messages.append([piece, literal])
+        else:
+            messages[-1][0] += piece
+            if messages[-1][1] is None:
+                messages[-1][1] = literal
+    
+    fetched = []
+    for envelope, literal in messages:
+        if literal is None:
+            continue
+        uid_match = _RE_FETCH_UID.search(envelope)
+        fetched.append((uid_match.group(1) if uid_match else None, literal))
+    return fetched
+
+def _may_have_attachment(bodystructure):
+    """
+    Check a BODYSTRUCTURE response for attachments process_attachments handles.
+    
+    Names that are encoded or sent as literals cannot be read from the
+    structure, so they count as possible attachments.
+    
+    Args:
+        bodystructure (bytes): FETCH response for one message
+        
+    Returns:
+        bool: False only if the email certainly has no such attachment
+    """
+    names = _RE_BODYSTRUCTURE_NAME.findall(bodystructure)
+    if len(names) < len(_RE_BODYSTRUCTURE_NAME_PARAM.findall(bodystructure)):
+        return True
+    return any(b'=?' in name or name.decode('ascii', 'replace').lower().endswith(_ATTACHMENT_EXTENSIONS)
+               for name in names)
+
+def _payload_digest(payload):
+    """
+    Hash an attachment's contents.
+    
+    Args:
+        payload (bytes): Decoded attachment payload
+        
+    Returns:
+        str: Hex BLAKE2b digest of the payload
+    """
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def _resources_have_font(resources, depth=0):
+    """
+    Check a page or Form XObject resource dictionary for fonts.
+    
+    Generated PDFs often draw their text inside Form XObjects, which carry
+    their own resources, so those are searched as well.
+    
+    Args:
+        resources: /Resources dictionary, possibly an indirect reference
+        depth (int): Form nesting level, limited to guard against cycles
+    
+    Returns:
+        bool: True if the resources or any nested form reference fonts
+    """
+    if resources is None or depth > 8:
+        return False
+    resources = resources.get_object()
+    if '/Font' in resources:
+        return True
+    xobjects = resources.get('/XObject')
+    if xobjects is None:
+        return False
+    for xobject in xobjects.get_object().values():
+        xobject = xobject.get_object()
+        if xobject.get('/Subtype') == '/Form' and _resources_have_font(xobject.get('/Resources'), depth + 1):
+            return True
+    return False
+
+def _pdf_has_text_layer(reader):
+    """
+    Check whether a PDF is born-digital by looking for fonts on its pages.
+    Scanned PDFs are page images without fonts and need OCR; pages are checked
+    until one has fonts, so a scanned cover page does not force OCR.
+    
+    Args:
+        reader (PdfReader): Reader for the PDF file
+    
+    Returns:
+        bool: True if any page references fonts
+    """
+    return any(_resources_have_font(page.get('/Resources')) for page in reader.pages)
+
 class InvoiceMonitor:
     def __init__(self, email_address, email_password, 
                  imap_server='imap.gmail.com', 
@@ -34,7 +276,8 @@ class InvoiceMonitor:
                  smtp_port=587,
                  invoice_download_path='./invoices',
                  log_path='./invoice_monitor.log',
-                 approver_email=None):
+                 approver_email=None,
+                 imap_body_search=False):
         
         self.email_address = email_address
         self.email_password = email_password
@@ -44,6 +287,9 @@ class InvoiceMonitor:
         self.smtp_port = smtp_port
         self.invoice_download_path = invoice_download_path
         self.approver_email = approver_email or os.getenv('APPROVER_EMAIL')
+        # Optionally let the server drop emails without invoice keywords; see
+        # _SEARCH_UNSEEN_INVOICES for the emails this can miss
+        self._search_criteria = _SEARCH_UNSEEN_INVOICES if imap_body_search else _SEARCH_UNSEEN
         
         # Initialize the database manager with email configuration
         self.db_manager = DatabaseManager()
@@ -64,46 +310,66 @@ class InvoiceMonitor:
         console_formatter = logging.Formatter('%(levelname)s: %(message)s')
         console_handler.setFormatter(console_formatter)
 
-        # Add both handlers to the logger
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # Both handlers run on a listener thread; the logger only queues
+        # records, so OCR and email processing never wait on log output
+        log_queue = queue.Queue(-1)
+        self._log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        self._log_listener.start()
+        atexit.register(self._log_listener.stop)
+        self.logger.addHandler(QueueHandler(log_queue))
+        # The listener already writes to the console; stop records also
+        # reaching the root handler from basicConfig in the calling thread
+        self.logger.propagate = False
         
         # Create directories
         os.makedirs(invoice_download_path, exist_ok=True)
         
-        # Initialize processed emails set
-        self.processed_emails = set()  # Track processed emails
-        
-        # Load previously processed emails if available
-        self.load_processed_emails()
+        # Processed emails are tracked in the database; move over any list
+        # left by older versions
+        self.migrate_processed_emails()
         
         # Schedule periodic summary reports
         self.last_summary_report = datetime.now()
+        
+        # IMAP connection reused across checks, and when it last saw traffic
+        self._mail = None
+        self._mail_last_used = 0.0
+        
+        # Failed processing attempts per email UID, cleared once it is handled
+        self._email_failures = {}
+        
+        # Worker processes for page OCR, started on the first scanned PDF
+        self._ocr_pool = None
+        
+        # SMTP session reused across outgoing emails
+        self._smtp = SMTPSession(smtp_server, smtp_port, email_address, email_password)
+        atexit.register(self._smtp.close)
+        
+        # Invoice CSV log, opened on the first invoice and kept open
+        self._csv_file = None
+        self._csv_writer = None
+        
+        # Threads that extract text from an email's attachments side by side
+        self._extract_pool = None
+        self._pool_lock = threading.Lock()
 
-    def load_processed_emails(self):
-
-        #Load previously processed email IDs from a file to avoid reprocessing.
+    def migrate_processed_emails(self):
+        """
+        Import processed email IDs from the JSON file used by older versions.
         
+        The IDs are copied into the database and the file is renamed so the
+        import runs only once.
+        """
         try:
             processed_emails_file = os.path.join(os.path.dirname(self.invoice_download_path), 'processed_emails.json')
             if os.path.exists(processed_emails_file):
                 with open(processed_emails_file, 'r') as f:
-                    self.processed_emails = set(json.load(f))
-                self.logger.info(f"Loaded {len(self.processed_emails)} previously processed emails")
+                    message_ids = json.load(f)
+                if self.db_manager.add_processed_emails_bulk(message_ids) is not None:
+                    os.replace(processed_emails_file, processed_emails_file + '.migrated')
+                    self.logger.info(f"Migrated {len(message_ids)} previously processed emails to the database")
         except Exception as e:
-            self.logger.error(f"Error loading processed emails: {e}")
-
-    def save_processed_emails(self):
-       
-        #Save processed email IDs to a file for persistence.
-    
-        try:
-            processed_emails_file = os.path.join(os.path.dirname(self.invoice_download_path), 'processed_emails.json')
-            with open(processed_emails_file, 'w') as f:
-                json.dump(list(self.processed_emails), f)
-            self.logger.info(f"Saved {len(self.processed_emails)} processed emails")
-        except Exception as e:
-            self.logger.error(f"Error saving processed emails: {e}")
+            self.logger.error(f"Error migrating processed emails: {e}")
 
     def connect_to_mailbox(self, retries=3, delay=60):
         """
@@ -142,25 +408,19 @@ class InvoiceMonitor:
         Returns:
             bool: True if the text likely contains invoice information
         """
-        invoice_keywords = [
-            'invoice', 'bill', 'receipt', 'statement', 
-            'total amount', 'due date', 'tax invoice',
-            'payment due', 'charges', 'order number', 
-            'balance due', 'purchase order', 'VAT', 'GST',
-            'invoice number', 'invoice date', 'billing date',
-            'payment terms', 'subtotal', 'total due', 'amount due',
-            'invoice total', 'account number', 'customer id'
-        ]
-        
         text_lower = text.lower()
-        keyword_matches = sum(1 for keyword in invoice_keywords if keyword in text_lower)
+        keyword_matches = 0
+        for keyword, longer_keywords in _INVOICE_KEYWORD_GROUPS:
+            if keyword in text_lower:
+                keyword_matches += 1 + sum(1 for k in longer_keywords if k in text_lower)
+                # Three matches settle it; the remaining keywords cannot change that
+                if keyword_matches >= 3:
+                    return True
         
         # More sophisticated detection logic
-        if keyword_matches >= 3:
+        if keyword_matches >= 2 and any(k in text_lower for k in ['invoice number', 'purchase order', 'total amount']):
             return True
-        elif keyword_matches >= 2 and any(k in text_lower for k in ['invoice number', 'purchase order', 'total amount']):
-            return True
-        elif re.search(r'invoice\s*#\s*\w+', text_lower) and re.search(r'total\s*[:$]?\s*\d+', text_lower):
+        elif _RE_INVOICE_REF.search(text_lower) and _RE_TOTAL_REF.search(text_lower):
             return True
         
         return False
@@ -175,21 +435,40 @@ class InvoiceMonitor:
         Returns:
             str: Extracted text from the email body
         """
-        body = ""
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                content_type = part.get_content_type()
-                if content_type == 'text/plain' or content_type == 'text/html':
-                    try:
-                        body += part.get_payload(decode=True).decode()
-                    except Exception as e:
-                        self.logger.error(f"Failed to decode email body: {e}")
-        else:
+        plain_parts, html_parts = [], []
+        for part in email_message.walk():
+            content_type = part.get_content_type()
+            if content_type == 'text/html':
+                html_parts.append(part)
+            elif content_type == 'text/plain' or not email_message.is_multipart():
+                plain_parts.append(part)
+        
+        # Multipart emails usually carry the same text as both plain and HTML
+        # alternatives; HTML is only read when there is no plain text
+        if plain_parts:
+            return "".join(self._decode_text_part(part) for part in plain_parts)
+        return "".join(_strip_html(self._decode_text_part(part)) for part in html_parts)
+
+    def _decode_text_part(self, part):
+        """
+        Decode a text part using its declared charset.
+        
+        Args:
+            part: Message part holding text
+            
+        Returns:
+            str: Decoded text, or an empty string if decoding failed
+        """
+        try:
+            payload = part.get_payload(decode=True) or b''
             try:
-                body = email_message.get_payload(decode=True).decode()
-            except Exception as e:
-                self.logger.error(f"Failed to decode email body: {e}")
-        return body
+                return payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+            except LookupError:
+                # Unknown charset name
+                return payload.decode('utf-8', errors='ignore')
+        except Exception as e:
+            self.logger.error(f"Failed to decode email body: {e}")
+            return ''
 
     def process_attachments(self, email_message, email_subject=None, email_sender=None):
         """
@@ -203,60 +482,110 @@ class InvoiceMonitor:
         Returns:
             list: List of processed invoice IDs
         """
-        processed_invoices = []
+        attachments = []
+        seen_digests = set()
         for part in email_message.walk():
             filename = part.get_filename()
             if filename:
                 self.logger.info(f"Found attachment: {filename}")
-                if filename.lower().endswith(('.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp')):
-                    filepath = self.download_attachment(email_message, filename)
+                if filename.lower().endswith(_ATTACHMENT_EXTENSIONS):
+                    # Resent attachments are recognised by their contents and
+                    # are not written to disk again
+                    payload = part.get_payload(decode=True) or b''
+                    digest = _payload_digest(payload)
+                    if digest in seen_digests or self.db_manager.is_attachment_processed(digest):
+                        self.logger.info(f"Attachment {filename} was already processed. Skipping.")
+                        continue
+                    seen_digests.add(digest)
+                    filepath = self.download_attachment(part, filename, payload)
                     if filepath:
-                        text = self.extract_text_from_file(filepath)
-                        self.logger.debug(f"Extracted text from {filename}: {text}")
-                        if self.is_potential_invoice(text):
-                            self.logger.info(f"Invoice detected in attachment: {filename}")
-                            # Extract invoice details with enhanced extraction
-                            invoice_details = self.extract_invoice_details_from_text(text, filepath, email_subject, email_sender)
-                            purchase_order = invoice_details.get('purchase_order')
-                            if purchase_order:
-                                if self.db_manager.validate_purchase_order(purchase_order):
-                                    self.logger.info(f"Purchase order {purchase_order} is valid.")
-                                else:
-                                    self.logger.warning(f"Purchase order {purchase_order} is not found in the database.")
-                            
-                            # Add invoice to database and get the invoice ID
-                            invoice_id = self.db_manager.add_invoice(invoice_details)
-                            if invoice_id:
-                                processed_invoices.append(invoice_id)
-                                self.logger.info(f"Added invoice to database with ID: {invoice_id}")
-                                
-                                # Log the invoice to CSV file
-                                self.log_invoice_to_csv(invoice_details)
-                        else:
-                            self.logger.info(f"Attachment {filename} is not an invoice.")
+                        attachments.append((filename, filepath, digest))
+        
+        # Extract text from all attachments concurrently: the work is mostly
+        # waiting on Tesseract, and the single-page images share one run
+        with self._pool_lock:
+            if self._extract_pool is None:
+                self._extract_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+                atexit.register(self._extract_pool.shutdown)
+        # Results are keyed by attachment position, not path
+        image_indexes = [index for index, (_, filepath, _) in enumerate(attachments)
+                         if filepath.lower().endswith(_BATCH_OCR_EXTENSIONS)]
+        image_future = self._extract_pool.submit(
+            self.extract_text_from_images, [attachments[index][1] for index in image_indexes])
+        text_futures = {
+            index: self._extract_pool.submit(self.extract_text_from_file, filepath)
+            for index, (_, filepath, _) in enumerate(attachments) if index not in image_indexes
+        }
+        image_texts = dict(zip(image_indexes, image_future.result()))
+        
+        processed_invoices = []
+        logged_invoices = []
+        for index, (filename, filepath, digest) in enumerate(attachments):
+            if index in image_texts:
+                text = image_texts[index]
+            else:
+                try:
+                    text = text_futures[index].result()
+                except Exception as e:
+                    self.logger.error(f"Text extraction failed for {filename}: {e}")
+                    continue
+            
+            # Only contents that yielded text are remembered, so a copy resent
+            # after a corrupt file or failed OCR is tried again
+            if text.strip():
+                self.db_manager.mark_attachment_processed(digest)
+            self.logger.debug(f"Extracted {len(text)} characters from {filename} "
+                              f"(hash {hashlib.blake2b(text.encode(), digest_size=8).hexdigest()})")
+            if self.is_potential_invoice(text):
+                self.logger.info(f"Invoice detected in attachment: {filename}")
+                # Extract invoice details with enhanced extraction
+                invoice_details = self.extract_invoice_details_from_text(text, filepath, email_subject, email_sender)
+                purchase_order = invoice_details.get('purchase_order')
+                if purchase_order:
+                    if self.db_manager.validate_purchase_order(purchase_order):
+                        self.logger.info(f"Purchase order {purchase_order} is valid.")
+                    else:
+                        self.logger.warning(f"Purchase order {purchase_order} is not found in the database.")
+                
+                # Add invoice to database and get the invoice ID
+                invoice_id = self.db_manager.add_invoice(invoice_details)
+                if invoice_id:
+                    processed_invoices.append(invoice_id)
+                    self.logger.info(f"Added invoice to database with ID: {invoice_id}")
+                    logged_invoices.append(invoice_details)
+            else:
+                self.logger.info(f"Attachment {filename} is not an invoice.")
+        
+        # Log the email's invoices to the CSV file together
+        if logged_invoices:
+            self.log_invoices_to_csv(logged_invoices)
         
         return processed_invoices
 
-    def download_attachment(self, msg, filename):
+    def download_attachment(self, part, filename, payload=None):
         """
         Download email attachment
         
         Args:
-            msg: Email message object
+            part: Message part holding the attachment
             filename (str): Name of the attachment to download
+            payload (bytes): Optional already decoded payload of the part
             
         Returns:
             str: Path to the downloaded file, or None if download failed
         """
         try:
-            for part in msg.walk():
-                if part.get_filename() == filename:
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    save_path = os.path.join(self.invoice_download_path, f"{timestamp}_{filename}")
-                    with open(save_path, 'wb') as f:
-                        f.write(part.get_payload(decode=True))
-                    self.logger.info(f"Downloaded attachment: {save_path}")
-                    return save_path
+            if payload is None:
+                payload = part.get_payload(decode=True)
+            # The content hash keeps same-named attachments that arrive in the
+            # same second from overwriting each other
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            save_path = os.path.join(self.invoice_download_path,
+                                     f"{timestamp}_{_payload_digest(payload)[:8]}_{filename}")
+            with open(save_path, 'wb') as f:
+                f.write(payload)
+            self.logger.info(f"Downloaded attachment: {save_path}")
+            return save_path
         except Exception as e:
             self.logger.error(f"Attachment download failed: {e}")
         return None
@@ -264,9 +593,16 @@ class InvoiceMonitor:
     def extract_text_from_file(self, filepath):
         
         if filepath.endswith('.pdf'):
-            # Extract text from PDF
             reader = PdfReader(filepath)
-            text = "\n".join(page.extract_text() for page in reader.pages if page.extract_text())
+            
+            # Scanned PDFs go straight to OCR, skipping a text pass that finds nothing
+            if not _pdf_has_text_layer(reader):
+                self.logger.info(f"No text layer in PDF {filepath}. Using OCR.")
+                return self.extract_text_from_pdf_with_ocr(filepath)
+            
+            # Extract text from PDF
+            page_texts = (page.extract_text() for page in reader.pages)
+            text = "\n".join(page_text for page_text in page_texts if page_text)
             
             # If no text is found, use OCR on each page image
             if not text.strip():
@@ -284,20 +620,62 @@ class InvoiceMonitor:
         
         try:
             text = pytesseract.image_to_string(Image.open(image_path))
-            self.logger.debug(f"OCR extracted text: {text}")
+            self.logger.debug(f"OCR extracted {len(text)} characters from {image_path}")
             return text
         except Exception as e:
             self.logger.error(f"Failed to extract text from image {image_path}: {e}")
             return ''
 
+    def extract_text_from_images(self, image_paths):
+        """
+        OCR several images with a single Tesseract process.
+        
+        Tesseract reads a text file listing image paths as one multi-page
+        input, so its model is loaded once rather than once per image. Pages
+        come back separated by form feeds, in list order.
+        
+        Args:
+            image_paths (list): Paths of single-frame images
+            
+        Returns:
+            list: Extracted text for each image, in the same order
+        """
+        if len(image_paths) < 2:
+            return [self.extract_text_from_image(path) for path in image_paths]
+        
+        list_path = None
+        try:
+            with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+                list_path = f.name
+                f.write("\n".join(os.path.abspath(path) for path in image_paths) + "\n")
+            pages = pytesseract.image_to_string(list_path).split('\f')
+            # The output ends with a form feed, leaving one extra empty piece
+            if len(pages) == len(image_paths) + 1:
+                self.logger.debug(f"OCR extracted text from {len(image_paths)} images in one batch")
+                return pages[:-1]
+            self.logger.warning("Batch OCR page count mismatch. OCRing images one at a time.")
+        except Exception as e:
+            self.logger.error(f"Batch OCR failed, OCRing images one at a time: {e}")
+        finally:
+            if list_path:
+                os.remove(list_path)
+        
+        return [self.extract_text_from_image(path) for path in image_paths]
+
     def extract_text_from_pdf_with_ocr(self, pdf_path):
        
         try:
-            from pdf2image import convert_from_path
-            pages = convert_from_path(pdf_path)
-            text = ""
-            for page in pages:
-                text += pytesseract.image_to_string(page)
+            page_count = len(PdfReader(pdf_path).pages)
+            with self._pool_lock:
+                if self._ocr_pool is None:
+                    # Forking here could copy locks held by the logging and
+                    # mail threads, so workers are spawned fresh instead
+                    self._ocr_pool = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                    atexit.register(self._ocr_pool.shutdown)
+            
+            # Pages are OCR'd in parallel and joined back in page order
+            text = "".join(self._ocr_pool.map(_ocr_pdf_page, [pdf_path] * page_count, range(1, page_count + 1)))
             self.logger.info(f"Extracted text from PDF {pdf_path} using OCR")
             return text
         except Exception as e:
@@ -333,179 +711,415 @@ class InvoiceMonitor:
         }
 
         # Extract invoice number
-        invoice_match = re.search(r'invoice\s*#\s*(\w+)', text, re.IGNORECASE)
+        invoice_match = _RE_INVOICE_NUMBER.search(text)
         if invoice_match:
             invoice_details['invoice_number'] = invoice_match.group(1)
         else:
             # Try alternative patterns
-            alt_invoice_match = re.search(r'invoice\s*(?:no|number|num)[.:\s]*(\w+[-\w]*)', text, re.IGNORECASE)
+            alt_invoice_match = _RE_INVOICE_NUMBER_ALT.search(text)
             if alt_invoice_match:
                 invoice_details['invoice_number'] = alt_invoice_match.group(1)
 
         # Extract purchase order number
-        po_match = re.search(r'purchase\s*order\s*#\s*(\w+)', text, re.IGNORECASE)
+        po_match = _RE_PURCHASE_ORDER.search(text)
         if po_match:
             invoice_details['purchase_order'] = po_match.group(1)
         else:
             # Try alternative patterns
-            alt_po_match = re.search(r'(?:po|p\.o\.|purchase\s*order)[.:\s#]*(\w+[-\w]*)', text, re.IGNORECASE)
+            alt_po_match = _RE_PURCHASE_ORDER_ALT.search(text)
             if alt_po_match:
                 invoice_details['purchase_order'] = alt_po_match.group(1)
 
         # Extract total amount
-        amount_match = re.search(r'total\s*amount\s*[:$]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', text, re.IGNORECASE)
+        amount_match = _RE_TOTAL_AMOUNT.search(text)
         if amount_match:
             invoice_details['total_amount'] = float(amount_match.group(1).replace(',', ''))
         else:
             # Try alternative patterns
-            alt_amount_match = re.search(r'(?:total|amount\s*due|balance\s*due|grand\s*total)[.:\s]*[$€£]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', text, re.IGNORECASE)
+            alt_amount_match = _RE_TOTAL_AMOUNT_ALT.search(text)
             if alt_amount_match:
                 invoice_details['total_amount'] = float(alt_amount_match.group(1).replace(',', ''))
 
         # Extract invoice date
-        date_match = re.search(r'\b\d{1,2}/\d{1,2}/\d{4}\b', text)
+        date_match = _RE_DATE.search(text)
         if date_match:
             invoice_details['invoice_date'] = date_match.group(0)
         else:
             # Try alternative date formats
-            alt_date_match = re.search(r'(?:invoice|bill|statement)\s*date[.:\s]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\w+\s+\d{1,2},?\s+\d{4})', text, re.IGNORECASE)
+            alt_date_match = _RE_INVOICE_DATE_ALT.search(text)
             if alt_date_match:
                 invoice_details['invoice_date'] = alt_date_match.group(1)
         
         # Extract vendor name
-        vendor_match = re.search(r'(?:vendor|supplier|from|bill\s*from|sold\s*by)[.:\s]*([A-Za-z0-9\s.,&]+?)(?:\n|Inc\.|\bLLC\b|\bLtd\b|\bCorp\.?\b)', text, re.IGNORECASE)
+        vendor_match = _RE_VENDOR.search(text)
         if vendor_match:
             invoice_details['vendor_name'] = vendor_match.group(1).strip()
         elif email_sender:
             # Try to extract vendor from email sender
-            sender_match = re.search(r'([^<@]+)@', email_sender)
+            sender_match = _RE_SENDER_NAME.search(email_sender)
             if sender_match:
                 invoice_details['vendor_name'] = sender_match.group(1).replace('.', ' ').title()
         
         # Extract due date
-        due_date_match = re.search(r'(?:due|payment\s*due|due\s*date)[.:\s]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\w+\s+\d{1,2},?\s+\d{4})', text, re.IGNORECASE)
+        due_date_match = _RE_DUE_DATE.search(text)
         if due_date_match:
             invoice_details['due_date'] = due_date_match.group(1)
         
         # Extract tax amount
-        tax_match = re.search(r'(?:tax|vat|gst)[.:\s]*[$€£]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', text, re.IGNORECASE)
+        tax_match = _RE_TAX.search(text)
         if tax_match:
             invoice_details['tax_amount'] = float(tax_match.group(1).replace(',', ''))
         
         # Extract subtotal
-        subtotal_match = re.search(r'(?:subtotal|sub\s*total)[.:\s]*[$€£]?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', text, re.IGNORECASE)
+        subtotal_match = _RE_SUBTOTAL.search(text)
         if subtotal_match:
             invoice_details['subtotal'] = float(subtotal_match.group(1).replace(',', ''))
         
         # Extract currency
-        currency_match = re.search(r'(?:currency|in)[.:\s]*(USD|EUR|GBP|JPY|CAD|AUD|CHF)', text, re.IGNORECASE)
+        currency_match = _RE_CURRENCY.search(text)
         if currency_match:
             invoice_details['currency'] = currency_match.group(1).upper()
-        elif re.search(r'[$]', text):
+        elif '$' in text:
             invoice_details['currency'] = 'USD'
-        elif re.search(r'[€]', text):
+        elif '€' in text:
             invoice_details['currency'] = 'EUR'
-        elif re.search(r'[£]', text):
+        elif '£' in text:
             invoice_details['currency'] = 'GBP'
 
         return invoice_details
 
     def log_invoice_to_csv(self, invoice_details):
        
+        self.log_invoices_to_csv([invoice_details])
+
+    def log_invoices_to_csv(self, invoice_list):
+        """
+        Append invoices to the CSV log in one write.
+        
+        The log file stays open for the life of the monitor and is flushed
+        after each batch.
+        
+        Args:
+            invoice_list (list): Invoice detail dictionaries
+        """
         try:
-            import csv
-            csv_file = './invoice_log.csv'
-            file_exists = os.path.isfile(csv_file)
+            if self._csv_file is None:
+                self._csv_file = open(_INVOICE_LOG_CSV, 'a', newline='', buffering=64 * 1024)
+                atexit.register(self._csv_file.close)
+                self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=_INVOICE_LOG_FIELDS)
+                # Appending starts at the end of the file, so position 0 means it is new
+                if self._csv_file.tell() == 0:
+                    self._csv_writer.writeheader()
             
-            with open(csv_file, 'a', newline='') as f:
-                fieldnames = ['filepath', 'filename', 'detected_at', 'invoice_number', 'total_amount', 'date']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                
-                if not file_exists:
-                    writer.writeheader()
-                
-                writer.writerow({
-                    'filepath': invoice_details.get('file_path', ''),
-                    'filename': os.path.basename(invoice_details.get('file_path', '')),
-                    'detected_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'invoice_number': invoice_details.get('invoice_number', 'N/A'),
-                    'total_amount': invoice_details.get('total_amount', 'N/A'),
-                    'date': invoice_details.get('invoice_date', 'N/A')
-                })
+            detected_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._csv_writer.writerows({
+                'filepath': invoice_details.get('file_path', ''),
+                'filename': os.path.basename(invoice_details.get('file_path', '')),
+                'detected_at': detected_at,
+                'invoice_number': invoice_details.get('invoice_number', 'N/A'),
+                'total_amount': invoice_details.get('total_amount', 'N/A'),
+                'date': invoice_details.get('invoice_date', 'N/A')
+            } for invoice_details in invoice_list)
+            self._csv_file.flush()
             
-            self.logger.info(f"Invoice logged to CSV: {invoice_details.get('file_path')}")
+            for invoice_details in invoice_list:
+                self.logger.info(f"Invoice logged to CSV: {invoice_details.get('file_path')}")
         except Exception as e:
             self.logger.error(f"Invoice CSV logging failed: {e}")
 
-    def monitor_mailbox(self, check_interval=60):
+    def monitor_mailbox(self, check_interval=60, idle_timeout=29 * 60):
+        """
+        Watch the inbox for unread invoice emails.
+        
+        One connection is reused while it stays healthy. Between checks the
+        monitor waits in IMAP IDLE so the server announces new mail, falling
+        back to polling every check_interval seconds when IDLE is unsupported.
         
+        Args:
+            check_interval (int): Seconds between polls, and before reconnecting
+            idle_timeout (int): Seconds before IDLE is re-issued; servers may
+                drop IDLE sessions after 30 minutes
+        """
         while True:
-            mail = self.connect_to_mailbox()
+            mail = self._get_mail()
             if not mail:
                 self.logger.error("Unable to connect to mailbox. Retrying in 60 seconds...")
                 time.sleep(60)
                 continue
 
             try:
-                # Select the Inbox folder
-                status, _ = mail.select("INBOX")
-                if status != 'OK':
-                    self.logger.error("Failed to select Inbox folder.")
-                    mail.logout()
-                    time.sleep(check_interval)
-                    continue
+                self.check_unseen_emails(mail)
+                self.wait_for_new_mail(mail, check_interval, idle_timeout)
+                self._mail_last_used = time.monotonic()
+                continue
+            except (imaplib.IMAP4.abort, ConnectionResetError, ssl.SSLError) as e:
+                # The server dropped the session; reconnect straight away
+                self.logger.warning(f"Mailbox connection lost: {e}")
+                self._close_mail()
+                continue
+            except Exception as e:
+                self.logger.error(f"Error while monitoring mailbox: {e}")
+                self._close_mail()
 
-                # Search for unread emails
-                status, messages = mail.search(None, 'UNSEEN')
-                if status != 'OK':
-                    self.logger.error("Failed to search for unread emails.")
-                    mail.logout()
-                    time.sleep(check_interval)
-                    continue
+            self.logger.info("Reconnecting after the check interval...")
+            time.sleep(check_interval)
 
-                if not messages[0]:
-                    self.logger.info("No new emails found.")
-                    
-                    # Check if it's time to generate a summary report
-                    if (datetime.now() - self.last_summary_report).total_seconds() > 86400:  # 24 hours
-                        self.generate_and_send_summary_report()
-                        self.last_summary_report = datetime.now()
-                    
-                    mail.logout()
-                    time.sleep(check_interval)
-                    continue
+    def _get_mail(self, max_idle=25 * 60):
+        """
+        Return the open IMAP connection, reconnecting if it is missing or stale.
+        
+        Args:
+            max_idle (int): Seconds without traffic after which the connection
+                is replaced rather than probed, ahead of server-side timeouts
+        
+        Returns:
+            IMAP4_SSL: Connection with the Inbox selected, or None on failure
+        """
+        if self._mail is not None:
+            if time.monotonic() - self._mail_last_used < max_idle:
+                try:
+                    if self._mail.noop()[0] == 'OK':
+                        self._mail_last_used = time.monotonic()
+                        return self._mail
+                except (imaplib.IMAP4.error, OSError):
+                    pass
+            self._close_mail()
 
-                # Process each unread email
-                for num in messages[0].split():
-                    status, msg_data = mail.fetch(num, '(RFC822)')
-                    email_body = msg_data[0][1]
-                    email_message = email.message_from_bytes(email_body)
+        mail = self.connect_to_mailbox()
+        if not mail:
+            return None
 
-                    # Process the email
-                    self.process_email(email_message)
+        # Select the Inbox folder
+        status, _ = mail.select("INBOX")
+        if status != 'OK':
+            self.logger.error("Failed to select Inbox folder.")
+            mail.logout()
+            return None
 
-                mail.logout()
-                
-                # Save processed emails list after each batch
-                self.save_processed_emails()
+        self._mail = mail
+        self._mail_last_used = time.monotonic()
+        return mail
 
-            except Exception as e:
-                self.logger.error(f"Error while monitoring mailbox: {e}")
+    def _close_mail(self):
+        """Log out of the IMAP connection if one is open."""
+        if self._mail is None:
+            return
+        try:
+            self._mail.logout()
+        except Exception:
+            pass
+        self._mail = None
 
+    def check_unseen_emails(self, mail):
+        """
+        Fetch and process every unread email in the selected mailbox.
+        
+        Args:
+            mail (IMAP4_SSL): Connection with the Inbox selected
+        """
+        # Search for unread candidate invoices by UID, which stays stable
+        # across sessions
+        status, messages = mail.uid('search', None, self._search_criteria)
+        if status != 'OK':
+            self.logger.error("Failed to search for unread emails.")
+            return
+
+        if not messages[0]:
+            self.logger.info("No new emails found.")
+            
+            # Check if it's time to generate a summary report
+            if (datetime.now() - self.last_summary_report).total_seconds() > 86400:  # 24 hours
+                self.generate_and_send_summary_report()
+                self.last_summary_report = datetime.now()
+            return
+
+        uids = self.filter_uids_with_attachments(mail, messages[0].split())
+        if not uids:
+            return
+
+        # Fetch unread emails a chunk at a time, so a large backlog is never
+        # held in memory at once. PEEK leaves them unread until they have
+        # been processed, so an email interrupted mid-way is picked up again
+        # by the next search
+        for start in range(0, len(uids), _FETCH_CHUNK_SIZE):
+            status, msg_data = mail.uid('fetch', b','.join(uids[start:start + _FETCH_CHUNK_SIZE]), '(BODY.PEEK[])')
+            if status != 'OK':
+                self.logger.error("Failed to fetch unread emails.")
+                return
+
+            processed_uids = []
+            try:
+                for uid, raw_message in _fetched_messages(msg_data):
+                    # A failing email is left unread to be retried, but does
+                    # not stop the emails after it
+                    try:
+                        email_message = email.message_from_bytes(raw_message)
+                        self.process_email(email_message)
+                    except Exception as e:
+                        failures = self._email_failures.get(uid, 0) + 1
+                        uid_text = uid.decode() if uid else 'unknown'
+                        self.logger.error(f"Error processing email UID {uid_text} "
+                                          f"(attempt {failures}/{_MAX_EMAIL_ATTEMPTS}): {e}")
+                        if failures < _MAX_EMAIL_ATTEMPTS:
+                            self._email_failures[uid] = failures
+                            continue
+                        self.logger.error(f"Giving up on email UID {uid_text}; flagging it as seen")
+                    self._email_failures.pop(uid, None)
+                    if uid:
+                        processed_uids.append(uid)
+            finally:
+                if processed_uids:
+                    mail.uid('store', b','.join(processed_uids), '+FLAGS', '(\\Seen)')
+            del msg_data
+
+    def filter_uids_with_attachments(self, mail, uids):
+        """
+        Drop emails that have no attachment that could hold an invoice.
+        
+        Only the BODYSTRUCTURE of each email is fetched, which is small next
+        to the full message. Dropped emails are flagged as seen, like the
+        emails that are processed.
+        
+        Args:
+            mail (IMAP4_SSL): Connection with the Inbox selected
+            uids (list): UIDs of the candidate emails, as bytes
+            
+        Returns:
+            list: UIDs of the emails worth fetching in full
+        """
+        # Fetched a chunk at a time, like the full messages, so a large
+        # backlog stays within server command-line limits
+        skipped = set()
+        for start in range(0, len(uids), _FETCH_CHUNK_SIZE):
+            chunk = uids[start:start + _FETCH_CHUNK_SIZE]
+            status, data = mail.uid('fetch', b','.join(chunk), '(BODYSTRUCTURE)')
+            if status != 'OK':
+                self.logger.warning("Failed to fetch email structure. Fetching all candidate emails.")
+                continue
+
+            # Literal strings split a message's response into several pieces;
+            # join them back together
+            responses = []
+            for piece in data:
+                literal = None
+                if isinstance(piece, tuple):
+                    piece, literal = piece
+                if not isinstance(piece, bytes):
+                    continue
+                if _RE_FETCH_START.match(piece) or not responses:
+                    responses.append(piece)
+                else:
+                    responses[-1] += piece
+                if literal:
+                    responses[-1] += literal
+
+            parsed, chunk_skipped = set(), []
+            for response in responses:
+                uid_match = _RE_FETCH_UID.search(response)
+                if not uid_match or b'BODYSTRUCTURE' not in response:
+                    continue
+                parsed.add(uid_match.group(1))
+                if not _may_have_attachment(response):
+                    chunk_skipped.append(uid_match.group(1))
+
+            # Emails whose structure could not be read are fetched in full
+            unparsed = [uid for uid in chunk if uid not in parsed]
+            if unparsed:
+                self.logger.warning(f"Could not read the structure of emails "
+                                    f"{b','.join(unparsed).decode()}. Fetching them in full.")
+            if chunk_skipped:
+                mail.uid('store', b','.join(chunk_skipped), '+FLAGS', '(\\Seen)')
+                skipped.update(chunk_skipped)
+
+        if skipped:
+            self.logger.info(f"Skipping {len(skipped)} emails without invoice attachments")
+        return [uid for uid in uids if uid not in skipped]
+
+    def wait_for_new_mail(self, mail, check_interval=60, idle_timeout=29 * 60):
+        """
+        Block until the server reports new mail, or until the timeout passes.
+        
+        Args:
+            mail (IMAP4_SSL): Connection with the Inbox selected
+            check_interval (int): Seconds to sleep when the server lacks IDLE
+            idle_timeout (int): Longest time to stay in a single IDLE command
+        """
+        if 'IDLE' not in mail.capabilities:
             self.logger.info("Waiting for the next check interval...")
             time.sleep(check_interval)
+            return
+
+        # imaplib has no IDLE support before Python 3.14, so the command is
+        # driven by hand on the connection's socket
+        tag = mail._new_tag()
+        mail.send(tag + b' IDLE\r\n')
+        
+        # Servers may send untagged responses, such as a pending EXISTS,
+        # before the continuation; new mail reported there ends the wait
+        new_mail = False
+        while True:
+            response = mail.readline()
+            if not response:
+                raise imaplib.IMAP4.abort("connection closed while starting IDLE")
+            if response.startswith(b'+'):
+                break
+            if response.startswith(tag):
+                mail.tagged_commands.pop(tag, None)
+                raise imaplib.IMAP4.error(f"IDLE rejected: {response!r}")
+            if response.startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort(response.decode(errors='replace').strip())
+            if response.startswith(b'*') and response.rstrip().endswith((b'EXISTS', b'RECENT')):
+                new_mail = True
+
+        self.logger.info("Waiting for new mail (IDLE)...")
+        deadline = time.monotonic() + idle_timeout
+        # Lines are read through the connection's buffered file, which may
+        # already hold responses that arrived with the continuation, so the
+        # wait is a socket timeout around readline() rather than select()
+        previous_timeout = mail.sock.gettimeout()
+        try:
+            while not new_mail:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                mail.sock.settimeout(remaining)
+                try:
+                    line = mail.readline()
+                except socket.timeout:
+                    # A socket file refuses reads after a timeout; nothing
+                    # arrived, so a fresh one loses no data
+                    mail.file.close()
+                    mail.file = mail.sock.makefile('rb')
+                    break
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                if line.startswith(b'* BYE'):
+                    raise imaplib.IMAP4.abort(line.decode(errors='replace').strip())
+                if line.rstrip().endswith((b'EXISTS', b'RECENT')):
+                    break
+        finally:
+            mail.sock.settimeout(previous_timeout)
+
+        # Leave IDLE and drain responses up to the tagged completion
+        mail.send(b'DONE\r\n')
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed while leaving IDLE")
+            if line.startswith(tag):
+                break
+        # _new_tag() registered the tag; imaplib only clears the ones it completes
+        mail.tagged_commands.pop(tag, None)
 
     def process_email(self, email_message):
         """
         Process an email to extract and log invoice details.
         """
         message_id = email_message.get("Message-ID", "")
-        if message_id in self.processed_emails:
+        if self.db_manager.is_email_processed(message_id):
             self.logger.info(f"Email with Message ID {message_id} already processed. Skipping.")
             return []
         
-        self.processed_emails.add(message_id)
-        
         # Decode email subject and sender
         email_subject = decode_email_header(email_message.get('subject', ''))
         email_sender = decode_email_header(email_message.get('from', ''))
@@ -522,7 +1136,10 @@ class InvoiceMonitor:
             processed_invoices = self.process_attachments(email_message, email_subject, email_sender)
         else:
             self.logger.info(f"No invoice detected in email: {email_subject}")
-            
+        
+        # Recorded only once processing has finished, so an email interrupted
+        # mid-way is processed again rather than skipped
+        self.db_manager.mark_email_processed(message_id)
         return processed_invoices
 
     def generate_and_send_summary_report(self, days=1):
@@ -544,7 +1161,13 @@ class InvoiceMonitor:
             
             # Export to CSV
             report_path = os.path.join(os.path.dirname(self.invoice_download_path), 'invoice_summary_report.csv')
-            report_df.to_csv(report_path, index=False)
+            if not self.db_manager.export_summary_report(report_path, df=report_df):
+                return False
+            
+            # Count statuses in one pass; the DataFrame is not needed after this
+            total_invoices = len(report_df)
+            status_counts = report_df['status'].value_counts().to_dict()
+            del report_df
             
             # Get pending approvals
             pending_approvals = self.db_manager.get_pending_approvals()
@@ -558,12 +1181,12 @@ class InvoiceMonitor:
             Period: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}
             
             Summary:
-            - Total Invoices Processed: {len(report_df)}
+            - Total Invoices Processed: {total_invoices}
             - Invoices Requiring Approval: {len(pending_approvals)}
-            - Validated Invoices: {len(report_df[report_df['status'] == 'validated'])}
-            - Approved Invoices: {len(report_df[report_df['status'] == 'approved'])}
-            - Rejected Invoices: {len(report_df[report_df['status'] == 'rejected'])}
-            - Pending Invoices: {len(report_df[report_df['status'] == 'pending'])}
+            - Validated Invoices: {status_counts.get('validated', 0)}
+            - Approved Invoices: {status_counts.get('approved', 0)}
+            - Rejected Invoices: {status_counts.get('rejected', 0)}
+            - Pending Invoices: {status_counts.get('pending', 0)}
             
             Pending Approvals:
             {self._format_pending_approvals(pending_approvals)}
@@ -625,15 +1248,13 @@ class InvoiceMonitor:
                             attachment['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
                             msg.attach(attachment)
             
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_address, self.email_password)
-                server.send_message(msg)
+            # Send email over the session kept open between sends
+            self._smtp.send_message(msg)
             
             self.logger.info(f"Email sent to {recipient}")
             return True
         except Exception as e:
+            self._smtp.close()
             self.logger.error(f"Error sending email: {e}")
             return False
 
@@ -661,6 +1282,7 @@ def main():
     smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
     smtp_port = int(os.getenv('SMTP_PORT', 587))
     approver_email = os.getenv('APPROVER_EMAIL')
+    imap_body_search = os.getenv('IMAP_BODY_SEARCH', 'false').lower() == 'true'
 
     # Initialize Invoice Monitor
     monitor = InvoiceMonitor(
@@ -670,7 +1292,8 @@ def main():
         imap_port=imap_port,
         smtp_server=smtp_server,
         smtp_port=smtp_port,
-        approver_email=approver_email
+        approver_email=approver_email,
+        imap_body_search=imap_body_search
     )
   
    # Generate an initial summary report if needed
@@ -682,7 +1305,7 @@ def main():
         monitor.monitor_mailbox()
     except KeyboardInterrupt:
         monitor.logger.info("Monitoring stopped by user")
-        monitor.save_processed_emails()
+        monitor._close_mail()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file